@@ -1,56 +1,96 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from mcp.server.fastmcp import FastMCP
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import asyncio
 import threading
 import argparse
 import logging
+import os
 # 导入日志配置
-from src.utils.logging_config import logger
+from src.utils.logging_config import logger, create_worker_log_queue, init_worker_logging
 
 # 导入工具函数
-from src.utils.plotting_utils import (
-    chart_config,
-    process_nested_params,
-    validate_parameters,
-    get_target_function,
-    filter_kwargs,
-    execute_plotting,
-    handle_plotting_exception,
-    setup_chart_theme
-)
-
-# 导入错误处理类
-from src.utils.error_handling import ValidationError, ChartGenerationError
-
-# 解析命令行参数
-parser = argparse.ArgumentParser(description='MCP绘图服务')
-parser.add_argument('--port', type=int, default=16666, help='服务端口号，默认为16666')
-parser.add_argument('--debug', action='store_true', help='启用调试模式')
-args = parser.parse_args()
-
-# 如果启用调试模式，设置应用日志为DEBUG级别
-if args.debug:
-    logger.setLevel(logging.DEBUG)
-    logger.debug("调试模式已启用")
-    # 调试模式下控制台也输出DEBUG级别日志
-    for handler in logger.handlers:
-        if isinstance(handler, logging.StreamHandler):
-            handler.setLevel(logging.DEBUG)
-
-# 创建FastMCP服务器实例
-mcp = FastMCP(name="PlottingService", host="0.0.0.0", port=args.port)
-
-
-# 初始化字体设置和图表主题
-try:
-    setup_chart_theme()
-    logger.info("图表主题和字体设置已完成")
-except Exception as e:
-    logger.error(f"图表主题和字体设置失败: {str(e)}")
-
-@mcp.tool()
-def create_plotting_task(plot_type, **params):
+from src.utils.plotting_utils import chart_config, run_plotting_task, run_plotting_task_async, handle_plotting_exception
+from src.utils.error_handling import ValidationError
+
+# 注意：工作进程以spawn方式启动，会将本模块作为__mp_main__重新导入，
+# 因此参数解析、服务实例创建等初始化只在main()中执行，模块顶层不产生副作用
+
+# 字体设置在首次生成图表时延迟执行（图表模块由chart_config按需导入），
+# 避免matplotlib等重量级依赖拖慢服务启动
+
+# 命令行参数，由main()解析后设置
+_debug_mode = False
+_workers = os.cpu_count() or 1
+
+# 绘图工作进程池，首次请求时创建
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='MCP绘图服务')
+    parser.add_argument('--port', type=int, default=16666, help='服务端口号，默认为16666')
+    parser.add_argument('--debug', action='store_true', help='启用调试模式')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='绘图工作进程数，默认为CPU核心数')
+    return parser.parse_args(argv)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """获取绘图工作进程池
+    
+    每个图表在独立进程中渲染，并发请求不再受GIL和pyplot全局状态限制；
+    使用spawn方式启动，避免在服务线程运行后fork进程
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            context = multiprocessing.get_context("spawn")
+            # 工作进程的日志通过队列交给主进程统一写入控制台和日志文件
+            _executor = ProcessPoolExecutor(
+                max_workers=_workers,
+                mp_context=context,
+                initializer=init_worker_logging,
+                initargs=(create_worker_log_queue(context), logger.level)
+            )
+            logger.info("绘图工作进程池已创建，进程数: %s", _workers)
+        return _executor
+
+
+def discard_executor(executor: ProcessPoolExecutor) -> None:
+    """丢弃已损坏的工作进程池，下次请求时重新创建
+    
+    工作进程异常退出（内存不足、崩溃等）后进程池将永久不可用，
+    若不重建则后续所有请求都会失败
+    """
+    global _executor
+    with _executor_lock:
+        # 同一批次的多个任务可能同时发现进程池损坏，只处理一次
+        if _executor is executor:
+            _executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            logger.warning("绘图工作进程异常退出，进程池将在下次请求时重新创建")
+
+
+async def dispatch_plotting_task(plot_type, params):
+    """按图表类型分派绘图任务：外部进程渲染的图表直接在事件循环中等待，其余交给工作进程池"""
+    if chart_config.is_async(plot_type):
+        # 外部进程渲染的图表直接在事件循环中等待，无需占用工作进程
+        return await run_plotting_task_async(plot_type, params, _debug_mode)
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    try:
+        return await loop.run_in_executor(executor, run_plotting_task, plot_type, params, _debug_mode)
+    except BrokenProcessPool as e:
+        discard_executor(executor)
+        return handle_plotting_exception(e, _debug_mode)
+
+
+async def create_plotting_task(plot_type, **params):
     """
     生成图表并保存到指定路径
     
@@ -133,59 +173,94 @@ def create_plotting_task(plot_type, **params):
     Returns:
         dict: 包含图表保存路径和状态的响应
     """
-    try:
-        logger.info(f"接收到图表生成请求: plot_type={plot_type}")
-        
-        # 处理嵌套参数结构
-        params = process_nested_params(params)
-        logger.debug(f"处理后的参数: {params}")
-        
-        # 检查图表类型支持
-        if not chart_config.is_supported(plot_type):
-            supported_types = ', '.join(chart_config.supported_chart_types)
-            raise ValidationError(f"不支持的图表类型: {plot_type}。支持的类型有: {supported_types}")
-        
-        # 验证参数
-        validate_parameters(plot_type, params)
-        
-        # 单独处理主题设置
-        if 'theme' in params:
-            try:
-                setup_chart_theme(params['theme'])
-                logger.debug(f"应用自定义主题: {params['theme']}")
-            except Exception as e:
-                logger.warning(f"设置主题时出错，但继续执行: {str(e)}")
-        
-        # 获取绘图函数和过滤参数
-        target_func, target_sig = get_target_function(plot_type)
-        filtered_params = filter_kwargs(params, target_sig)
-        
-        # 执行绘图
-        logger.info(f"开始生成图表，图表类型: {plot_type}")
-        result = execute_plotting(target_func, filtered_params, target_sig)
-        
-        logger.info(f"图表生成成功，保存路径: {result}")
-        return {"status": "success", "message": "图表生成成功", "save_path": result}
-    except Exception as e:
-        return handle_plotting_exception(e, args.debug)
+    logger.info(f"接收到图表生成请求: plot_type={plot_type}")
+    return await dispatch_plotting_task(plot_type, params)
+
+
+async def create_plotting_tasks(tasks: list):
+    """
+    批量生成多个图表，所有任务并发执行
+    
+    Args:
+        tasks: 任务列表，每个任务为包含plot_type和params的字典，
+            示例: [{"plot_type": "line_chart", "params": {...}}, {"plot_type": "mermaid_chart", "params": {...}}]
+            params中的参数与create_plotting_task相同；也可以省略params，将参数直接与plot_type放在同一层
+    
+    Returns:
+        list: 与tasks顺序一致的响应列表，每项包含图表保存路径和状态
+    """
+    logger.info(f"接收到批量图表生成请求: 任务数={len(tasks)}")
+    results = [None] * len(tasks)
+    pending = {}
+    for index, task in enumerate(tasks):
+        # 格式错误的任务只在对应位置返回错误响应，不影响同批次的其他任务
+        if not isinstance(task, dict):
+            results[index] = handle_plotting_exception(
+                ValidationError(f"第{index + 1}个任务必须是字典类型", field_name="tasks",
+                                expected="dict", actual=type(task).__name__), _debug_mode)
+            continue
+        task = dict(task)
+        plot_type = task.pop('plot_type', None)
+        params = task.pop('params', task)
+        if not isinstance(params, dict):
+            results[index] = handle_plotting_exception(
+                ValidationError(f"第{index + 1}个任务的params必须是字典类型", field_name="params",
+                                expected="dict", actual=type(params).__name__), _debug_mode)
+            continue
+        pending[index] = dispatch_plotting_task(plot_type, params)
+    outcomes = await asyncio.gather(*pending.values(), return_exceptions=True)
+    # 工作进程异常退出等未被任务捕获的错误转换为错误响应
+    for index, result in zip(pending, outcomes):
+        results[index] = handle_plotting_exception(result, _debug_mode) if isinstance(result, Exception) else result
+    return results
+
+
+def create_server(port: int):
+    """创建FastMCP服务器实例并注册绘图工具"""
+    # 工作进程重新导入本模块时无需加载MCP服务相关依赖
+    from mcp.server.fastmcp import FastMCP
+    
+    mcp = FastMCP(name="PlottingService", host="0.0.0.0", port=port)
+    mcp.tool()(create_plotting_task)
+    mcp.tool()(create_plotting_tasks)
+    return mcp
 
 
-# 启动MCP服务线程
-def run_mcp_service():
+# 启动MCP服务
+def run_mcp_service(mcp) -> None:
     logger.info('启动MCP绘图服务...')
     try:
         mcp.run(transport="streamable-http")
     except Exception as e:
         logger.error(f'MCP服务启动失败: {str(e)}')
 
-if __name__ == "__main__":
-    # 在主线程中启动服务
-    mcp_thread = threading.Thread(target=run_mcp_service, daemon=True)
-    mcp_thread.start()
+
+def main(argv=None) -> None:
+    """解析命令行参数并运行服务"""
+    global _debug_mode, _workers
+    args = parse_args(argv)
+    _debug_mode = args.debug
+    _workers = max(1, args.workers or 1)
+    
+    # 如果启用调试模式，设置应用日志为DEBUG级别
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.debug("调试模式已启用")
+        # 调试模式下控制台也输出DEBUG级别日志
+        for handler in logger.handlers:
+            if isinstance(handler, logging.StreamHandler):
+                handler.setLevel(logging.DEBUG)
     
-    # 保持主线程运行
+    # 在主线程中直接运行服务，mcp.run自带事件循环并阻塞到服务退出，无需轮询等待
     try:
-        while True:
-            threading.Event().wait(1)
+        run_mcp_service(create_server(args.port))
     except KeyboardInterrupt:
-        logger.info("MCP绘图服务已停止")
\ No newline at end of file
+        pass
+    finally:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("MCP绘图服务已停止")
+
+
+if __name__ == "__main__":
+    main()
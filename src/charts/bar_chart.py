@@ -1,18 +1,43 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 import seaborn as sns
 import logging
-from typing import List, Dict, Any, Optional
+from matplotlib.artist import setp
+from typing import List, Dict, Any, Optional, Tuple
 from src.plotting_base import PlottingBase
+from src.utils.frame_utils import records_digest, records_to_frame, cached_frame
 
 # 获取logger实例
 logger = logging.getLogger(__name__)
 
 
+def _melt_frame(df: pd.DataFrame, x_field: str, y_fields: List[str]) -> pd.DataFrame:
+    """将宽格式数据转换为分组柱状图所需的长格式数据
+    
+    行顺序与pd.melt一致（按系列依次排列），直接拼接数组，避免melt的索引处理开销
+    """
+    return pd.DataFrame({
+        x_field: np.tile(df[x_field].to_numpy(), len(y_fields)),
+        'Series': np.repeat(np.array(y_fields, dtype=object), len(df)),
+        'Value': np.concatenate([df[y_field].to_numpy() for y_field in y_fields])
+    }, copy=False)
+
+
+def _stack_bottoms(values: np.ndarray) -> np.ndarray:
+    """计算堆叠柱状图每个系列的起点
+    
+    Args:
+        values: 形状为(系列数, 数据点数)的数值矩阵
+        
+    Returns:
+        np.ndarray: 与values形状相同的矩阵，第i行为前i个系列的累加和
+    """
+    return np.cumsum(values, axis=0) - values
+
+
 class BarChart(PlottingBase):
     """柱状图生成器"""
     
@@ -35,9 +60,10 @@ class BarChart(PlottingBase):
         horizontal: bool = False,
         theme: str = "default",
         save_path: str = None,
-        figsize: tuple = (10, 6),
+        figsize: Tuple[float, float] = (10, 6),
         dpi: int = 100,
-        grid: bool = True
+        grid: bool = True,
+        _data_digest: Optional[bytes] = None
     ) -> str:
         """
         生成柱状图
@@ -60,6 +86,7 @@ class BarChart(PlottingBase):
             figsize: 图形大小
             dpi: 图像分辨率
             grid: 是否显示网格
+            _data_digest: 调用方已计算的数据摘要（绘图服务流程中传入，避免重复计算），为None时自动计算
         
         返回:
             文件路径
@@ -73,7 +100,10 @@ class BarChart(PlottingBase):
             if not y_fields:
                 raise ValueError("Y轴字段名列表不能为空")
             
-            df = pd.DataFrame(data)
+            # 相同数据重复请求时复用缓存的数据帧
+            if _data_digest is None:
+                _data_digest = records_digest(data)
+            df = records_to_frame(data, _data_digest)
             
             # 检查字段是否存在
             if x_field not in df.columns:
@@ -86,59 +116,61 @@ class BarChart(PlottingBase):
             self._set_theme(theme)
             
             # 创建图形
-            plt.figure(figsize=figsize, dpi=dpi)
+            fig = self._get_figure(figsize, dpi)
+            ax = fig.add_subplot(111)
             
-            # 使用seaborn的barplot
             if len(y_fields) == 1:
-                # 单个y字段的情况
+                # 单个y字段的情况，直接绘制原始数值，无需seaborn的统计估计
                 y_field = y_fields[0]
-                ax = sns.barplot(
-                    data=df,
-                    x=x_field if not horizontal else y_field,
-                    y=y_field if not horizontal else x_field,
-                    color=colors[0] if colors and len(colors) > 0 else None,
-                    palette=colors if colors else None,
-                    width=bar_width,
-                    ax=plt.gca()
-                )
+                x_values = df[x_field].to_numpy()
+                x_pos = np.arange(len(x_values))
+                # 颜色列表按柱子循环使用
+                bar_colors = colors if colors else None
+                
+                if horizontal:
+                    ax.barh(x_pos, df[y_field].to_numpy(), bar_width, color=bar_colors,
+                            edgecolor=edge_color, linewidth=edge_width)
+                    ax.set_yticks(x_pos, labels=x_values)
+                    # 与分类坐标轴一致，第一个类别显示在顶部
+                    ax.invert_yaxis()
+                    ax.set_xlabel(y_field)
+                else:
+                    ax.bar(x_pos, df[y_field].to_numpy(), bar_width, color=bar_colors,
+                           edgecolor=edge_color, linewidth=edge_width)
+                    ax.set_xticks(x_pos, labels=x_values)
+                    ax.set_ylabel(y_field)
             else:
                 # 多个y字段的情况
                 if stack:
                     # 堆叠柱状图实现
-                    ax = plt.gca()
-                    x_values = df[x_field].unique()
+                    x_values = df[x_field].to_numpy()
                     x_pos = np.arange(len(x_values))
-                    bottom = np.zeros(len(x_values))
+                    
+                    # 一次性提取所有系列并计算堆叠起点
+                    values = df[list(y_fields)].to_numpy(dtype=np.float64).T
+                    bottoms = _stack_bottoms(values)
                     
                     for i, y_field in enumerate(y_fields):
                         color = colors[i] if colors and i < len(colors) else None
-                        bars = ax.bar(x_pos if not horizontal else df[y_field],
-                                      df[y_field] if not horizontal else x_pos,
-                                      bar_width,
-                                      bottom=bottom if not horizontal else None,
-                                      left=bottom if horizontal else None,
-                                      label=y_field,
-                                      color=color)
-                        
-                        # 添加边框
-                        for patch in bars:
-                            patch.set_edgecolor(edge_color)
-                            patch.set_linewidth(edge_width)
-                        
-                        # 更新堆叠位置
-                        bottom += df[y_field].to_numpy()
+                        if horizontal:
+                            ax.barh(x_pos, values[i], bar_width, left=bottoms[i], label=y_field,
+                                    color=color, edgecolor=edge_color, linewidth=edge_width)
+                        else:
+                            ax.bar(x_pos, values[i], bar_width, bottom=bottoms[i], label=y_field,
+                                   color=color, edgecolor=edge_color, linewidth=edge_width)
                     
                     # 设置x轴标签
                     if not horizontal:
-                        ax.set_xticks(x_pos)
-                        ax.set_xticklabels(x_values)
+                        ax.set_xticks(x_pos, labels=x_values)
                     else:
-                        ax.set_yticks(x_pos)
-                        ax.set_yticklabels(x_values)
+                        ax.set_yticks(x_pos, labels=x_values)
                 else:
                     # 分组柱状图实现（使用长格式数据）
-                    long_df = pd.melt(df, id_vars=[x_field], value_vars=y_fields, 
-                                     var_name='Series', value_name='Value')
+                    if _data_digest is not None:
+                        long_df = cached_frame(('long', _data_digest, x_field, tuple(y_fields)),
+                                               lambda: _melt_frame(df, x_field, y_fields))
+                    else:
+                        long_df = _melt_frame(df, x_field, y_fields)
                     
                     ax = sns.barplot(
                         data=long_df,
@@ -147,14 +179,11 @@ class BarChart(PlottingBase):
                         hue='Series',
                         palette=colors if colors else None,
                         width=bar_width,
-                        ax=plt.gca()
+                        edgecolor=edge_color,
+                        linewidth=edge_width,
+                        ax=ax
                     )
             
-            # 设置边框
-            for patch in ax.patches:
-                patch.set_edgecolor(edge_color)
-                patch.set_linewidth(edge_width)
-            
             # 设置标题和标签
             ax.set_title(title, fontsize=16)
             if horizontal:
@@ -170,8 +199,9 @@ class BarChart(PlottingBase):
             ax.tick_params(axis='both', labelsize=10)
             
             # 调整x轴标签旋转
-            if not horizontal:
-                ax.set_xticklabels(ax.get_xticklabels(), rotation=45 if len(df) > 5 else 0, ha='right')
+            if not horizontal and len(df) > 5:
+                ax.tick_params(axis='x', labelrotation=45)
+                setp(ax.get_xticklabels(), ha='right')
             
             # 添加图例
             if len(y_fields) > 1:
@@ -182,15 +212,14 @@ class BarChart(PlottingBase):
             if grid:
                 ax.grid(axis='y', linestyle="--", alpha=0.5)
             
-            plt.tight_layout()
+            fig.tight_layout()
             
             # 保存图表
-            return self._save_plot(save_path, "bar_chart")
+            return self._save_plot(save_path, "bar_chart", fig)
         except Exception as e:
             logger.error(f"生成柱状图失败: {str(e)}")
             # 确保清除当前图形
-            plt.clf()
-            plt.close()
+            self._clear_figure()
             raise
 
 
@@ -1,17 +1,179 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import matplotlib.pyplot as plt
+import matplotlib
 import pandas as pd
 import seaborn as sns
 import numpy as np
 import logging
-from typing import List, Dict, Any, Optional
+import re
+from matplotlib.artist import setp
+from matplotlib.colors import Normalize
+from typing import List, Dict, Any, Literal, Optional, Tuple
 from src.plotting_base import PlottingBase
+from src.utils.frame_utils import records_digest, cached_frame, ensure_fields, records_to_columns
 
 # 获取logger实例
 logger = logging.getLogger(__name__)
 
+# 单元格数量超过该阈值时改用栅格化渲染（注释在该规模下不可读）
+LARGE_HEATMAP_CELLS = 10_000
+
+# 栅格化渲染时每个坐标轴最多显示的刻度数
+MAX_AXIS_TICKS = 20
+
+# 可直接转换为printf风格的浮点数格式，用于批量生成注释文本
+_PRINTF_FORMAT = re.compile(r'[-+ #0]*\d*(?:\.\d+)?[eEfFgG]')
+
+# 支持的聚合函数
+AGGREGATION_FUNCS = {
+    'mean': np.mean,
+    'sum': np.sum,
+    'max': np.max,
+    'min': np.min,
+    'count': len
+}
+
+
+def _pivot_frame(df: pd.DataFrame, x_field: str, y_field: str, value_field: str, aggregation: str) -> pd.DataFrame:
+    """根据数据帧创建透视表（通用实现，用于无法向量化的数据）"""
+    return df.pivot_table(
+        values=value_field,
+        index=y_field,
+        columns=x_field,
+        aggfunc=AGGREGATION_FUNCS[aggregation]
+    )
+
+
+def _aggregate_matrix(x: np.ndarray, y: np.ndarray, values: np.ndarray, x_field: str, y_field: str,
+                      aggregation: str) -> pd.DataFrame:
+    """基于整数编码的分类索引，使用NumPy聚合生成透视表
+    
+    行为与pivot_table保持一致：忽略缺失值，没有数据的单元格为NaN，行列标签升序排列；
+    所有单元格都有数据时，计数以及整数值的sum/max/min结果保持int64类型
+    """
+    integral = values.dtype.kind in 'iu'
+    values = values.astype(np.float64)
+    valid = ~np.isnan(values)
+    x, y, values = x[valid], y[valid], values[valid]
+    
+    x_labels, x_idx = np.unique(x, return_inverse=True)
+    y_labels, y_idx = np.unique(y, return_inverse=True)
+    cells = (y_idx.ravel(), x_idx.ravel())
+    shape = (len(y_labels), len(x_labels))
+    
+    counts = np.zeros(shape)
+    np.add.at(counts, cells, 1)
+    
+    if aggregation == 'count':
+        matrix = counts
+    elif aggregation in ('sum', 'mean'):
+        matrix = np.zeros(shape)
+        np.add.at(matrix, cells, values)
+        if aggregation == 'mean':
+            matrix = matrix / np.where(counts > 0, counts, 1)
+    elif aggregation == 'max':
+        matrix = np.full(shape, -np.inf)
+        np.maximum.at(matrix, cells, values)
+    else:
+        matrix = np.full(shape, np.inf)
+        np.minimum.at(matrix, cells, values)
+    if counts.all():
+        if aggregation == 'count' or (integral and aggregation != 'mean'):
+            matrix = matrix.astype(np.int64)
+    else:
+        matrix[counts == 0] = np.nan
+    
+    return pd.DataFrame(
+        matrix,
+        index=pd.Index(y_labels, name=y_field),
+        columns=pd.Index(x_labels, name=x_field)
+    )
+
+
+def _is_integer_format(fmt: str) -> bool:
+    """判断数值格式是否只能用于整数（如'd'、'x'）"""
+    return bool(fmt) and fmt[-1] in 'bcdoxX'
+
+
+def _pivot_records(data: List[Dict[str, Any]], x_field: str, y_field: str, value_field: str,
+                   aggregation: str, integer_format: bool = False) -> pd.DataFrame:
+    """根据记录列表创建透视表，优先使用NumPy向量化聚合
+    
+    Args:
+        integer_format: 注释是否使用整数格式；向量化结果不是整数类型时回退到pivot_table，
+            与其类型推断保持一致
+    """
+    columns = records_to_columns(data, [x_field, y_field, value_field])
+    try:
+        pivot_table = _aggregate_matrix(columns[x_field], columns[y_field], columns[value_field],
+                                        x_field, y_field, aggregation)
+        if not integer_format or pivot_table.dtypes.map(lambda dtype: dtype.kind in 'iu').all():
+            return pivot_table
+        logger.debug("整数注释格式需要pivot_table的类型推断，回退到pivot_table")
+    except (TypeError, ValueError) as e:
+        # 分类值无法排序或数值无法转换时，回退到pandas实现
+        logger.debug("向量化聚合不可用，回退到pivot_table: %s", e)
+    return _pivot_frame(pd.DataFrame(data), x_field, y_field, value_field, aggregation)
+
+
+def _annotation_colors(values: np.ndarray, color_map: str) -> np.ndarray:
+    """根据单元格背景色亮度一次性计算注释文本颜色
+    
+    Args:
+        values: 透视表数值矩阵
+        color_map: 颜色映射
+        
+    Returns:
+        np.ndarray: 按行优先顺序排列的非空单元格文本颜色，与seaborn绘制注释的顺序一致
+    """
+    cells = values[~np.isnan(values)]
+    if cells.size == 0:
+        return np.empty(0, dtype=object)
+    norm = Normalize(vmin=cells.min(), vmax=cells.max())
+    rgba = matplotlib.colormaps.get_cmap(color_map)(norm(cells))
+    # 计算背景色亮度
+    brightness = rgba[:, :3] @ np.array([0.299, 0.587, 0.114])
+    return np.where(brightness < 0.5, 'white', 'black')
+
+
+def _annotation_labels(values: np.ndarray, fmt: str) -> Optional[np.ndarray]:
+    """批量格式化注释文本，避免seaborn逐单元格调用format
+    
+    Args:
+        values: 透视表数值矩阵
+        fmt: 数值格式
+        
+    Returns:
+        Optional[np.ndarray]: 与values形状相同的字符串矩阵，格式无法转换为printf风格时返回None
+    """
+    if not _PRINTF_FORMAT.fullmatch(fmt):
+        return None
+    return np.char.mod('%' + fmt, values)
+
+
+def _draw_raster_heatmap(ax, pivot_table: pd.DataFrame, color_map: str, cbar_kws: Dict[str, Any]) -> None:
+    """使用imshow栅格化绘制大规模热力图，渲染开销与像素数相关而非单元格数
+    
+    Args:
+        ax: 目标坐标轴
+        pivot_table: 透视表
+        color_map: 颜色映射
+        cbar_kws: 颜色条参数
+    """
+    values = np.ma.masked_invalid(pivot_table.to_numpy(dtype=np.float64))
+    image = ax.imshow(values, cmap=color_map, aspect='auto', interpolation='nearest')
+    ax.figure.colorbar(image, ax=ax, **cbar_kws)
+    
+    # 抽样显示刻度标签，避免标签重叠
+    for axis, labels in ((ax.xaxis, pivot_table.columns), (ax.yaxis, pivot_table.index)):
+        step = max(1, -(-len(labels) // MAX_AXIS_TICKS))
+        ticks = np.arange(0, len(labels), step)
+        axis.set_ticks(ticks, labels=[str(labels[i]) for i in ticks])
+    
+    ax.set_xlabel(pivot_table.columns.name)
+    ax.set_ylabel(pivot_table.index.name)
+
 
 class HeatMap(PlottingBase):
     """热力图生成器"""
@@ -33,12 +195,13 @@ class HeatMap(PlottingBase):
         fmt: str = '.2f',
         linewidths: float = 0.5,
         linecolor: str = 'white',
-        aggregation: str = 'mean',
+        aggregation: Literal['mean', 'sum', 'max', 'min', 'count'] = 'mean',
         cbar_kws: Dict[str, Any] = None,
         theme: str = "default",
         save_path: str = None,
-        figsize: tuple = (10, 8),
-        dpi: int = 100
+        figsize: Tuple[float, float] = (10, 8),
+        dpi: int = 100,
+        _data_digest: Optional[bytes] = None
     ) -> str:
         """
         生成热力图
@@ -62,6 +225,7 @@ class HeatMap(PlottingBase):
             save_path: 保存路径
             figsize: 图形大小
             dpi: 图像分辨率
+            _data_digest: 调用方已计算的数据摘要（绘图服务流程中传入，避免重复计算），为None时自动计算
         
         返回:
             文件路径
@@ -77,57 +241,55 @@ class HeatMap(PlottingBase):
             if not value_field:
                 raise ValueError("数值字段名不能为空")
             
-            df = pd.DataFrame(data)
-            
             # 检查字段是否存在
-            if x_field not in df.columns:
-                raise ValueError(f"数据中不存在字段 '{x_field}'")
-            if y_field not in df.columns:
-                raise ValueError(f"数据中不存在字段 '{y_field}'")
-            if value_field not in df.columns:
-                raise ValueError(f"数据中不存在字段 '{value_field}'")
-            
-            # 支持的聚合函数
-            aggregation_funcs = {
-                'mean': np.mean,
-                'sum': np.sum,
-                'max': np.max,
-                'min': np.min,
-                'count': len
-            }
-            
-            if aggregation not in aggregation_funcs:
-                raise ValueError(f"不支持的聚合函数 '{aggregation}'，支持的有: {', '.join(aggregation_funcs.keys())}")
-            
-            # 创建透视表
-            pivot_table = df.pivot_table(
-                values=value_field,
-                index=y_field,
-                columns=x_field,
-                aggfunc=aggregation_funcs[aggregation]
-            )
+            ensure_fields(data, [x_field, y_field, value_field])
+            
+            if aggregation not in AGGREGATION_FUNCS:
+                raise ValueError(f"不支持的聚合函数 '{aggregation}'，支持的有: {', '.join(AGGREGATION_FUNCS.keys())}")
+            
+            integer_format = annotate and _is_integer_format(fmt)
+            
+            # 创建透视表（数据可序列化时使用缓存，相同数据和参数的重复渲染直接复用）
+            if _data_digest is None:
+                _data_digest = records_digest(data)
+            if _data_digest is not None:
+                pivot_table = cached_frame(
+                    ('pivot', _data_digest, x_field, y_field, value_field, aggregation, integer_format),
+                    lambda: _pivot_records(data, x_field, y_field, value_field, aggregation, integer_format)
+                )
+            else:
+                pivot_table = _pivot_records(data, x_field, y_field, value_field, aggregation, integer_format)
             
             # 设置主题
             self._set_theme(theme)
             
             # 创建图形
-            plt.figure(figsize=figsize, dpi=dpi)
-            ax = plt.gca()
+            fig = self._get_figure(figsize, dpi)
+            ax = fig.add_subplot(111)
             
             # 绘制热力图
             if cbar_kws is None:
                 cbar_kws = {}
             
-            sns.heatmap(
-                pivot_table,
-                annot=annotate,
-                fmt=fmt,
-                cmap=color_map,
-                linewidths=linewidths,
-                linecolor=linecolor,
-                ax=ax,
-                cbar_kws=cbar_kws
-            )
+            if pivot_table.size > LARGE_HEATMAP_CELLS:
+                # 大规模数据使用栅格化渲染，跳过逐单元格绘制和注释
+                logger.debug("热力图单元格数 %s 超过 %s，使用栅格化渲染", pivot_table.size, LARGE_HEATMAP_CELLS)
+                annotate = False
+                _draw_raster_heatmap(ax, pivot_table, color_map, cbar_kws)
+            else:
+                # 预先生成注释文本，无法批量格式化时交给seaborn处理
+                labels = _annotation_labels(pivot_table.to_numpy(dtype=np.float64), fmt) if annotate else None
+                sns.heatmap(
+                    pivot_table,
+                    annot=labels if labels is not None else annotate,
+                    fmt="" if labels is not None else fmt,
+                    cmap=color_map,
+                    linewidths=linewidths,
+                    linecolor=linecolor,
+                    ax=ax,
+                    cbar_kws=cbar_kws,
+                    annot_kws={'fontsize': 10}
+                )
             
             # 设置标题和标签
             ax.set_title(title, fontsize=16)
@@ -143,30 +305,25 @@ class HeatMap(PlottingBase):
             ax.tick_params(axis='both', labelsize=10)
             
             # 调整x轴标签旋转
-            ax.set_xticklabels(ax.get_xticklabels(), rotation=45 if len(pivot_table.columns) > 5 else 0, ha='right')
-            ax.set_yticklabels(ax.get_yticklabels(), rotation=0)
+            if len(pivot_table.columns) > 5:
+                ax.tick_params(axis='x', labelrotation=45)
+                setp(ax.get_xticklabels(), ha='right')
+            ax.tick_params(axis='y', labelrotation=0)
             
-            # 调整注释文本样式
+            # 调整注释文本颜色，根据背景色决定
             if annotate:
-                for text in ax.texts:
-                    text.set_fontsize(10)
-                    # 设置文本颜色，根据背景色决定
-                    # 先检查bbox_patch是否存在
-                    if text.get_bbox_patch() is not None:
-                        bg_color = text.get_bbox_patch().get_facecolor()
-                        # 计算背景色亮度
-                        brightness = (0.299 * bg_color[0] + 0.587 * bg_color[1] + 0.114 * bg_color[2])
-                        text.set_color('white' if brightness < 0.5 else 'black')
-            
-            plt.tight_layout()
+                text_colors = _annotation_colors(pivot_table.to_numpy(dtype=np.float64), color_map)
+                for text, text_color in zip(ax.texts, text_colors):
+                    text.set_color(text_color)
+            
+            fig.tight_layout()
             
             # 保存图表
-            return self._save_plot(save_path, "heatmap")
+            return self._save_plot(save_path, "heatmap", fig)
         except Exception as e:
             logger.error(f"生成热力图失败: {str(e)}")
             # 确保清除当前图形
-            plt.clf()
-            plt.close()
+            self._clear_figure()
             raise
 
 
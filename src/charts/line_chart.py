@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import matplotlib.pyplot as plt
-import pandas as pd
+import numpy as np
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from src.plotting_base import PlottingBase
+from src.utils.frame_utils import records_to_columns
 
 # 获取logger实例
 logger = logging.getLogger(__name__)
@@ -31,7 +31,7 @@ class LineChart(PlottingBase):
         markers: List[str] = None,
         theme: str = "default",
         save_path: str = None,
-        figsize: tuple = (10, 6),
+        figsize: Tuple[float, float] = (10, 6),
         dpi: int = 100,
         grid: bool = True
     ) -> str:
@@ -67,22 +67,15 @@ class LineChart(PlottingBase):
             if not y_fields:
                 raise ValueError("Y轴字段名列表不能为空")
             
-            # 将数据转换为DataFrame
-            df = pd.DataFrame(data)
-            
-            # 检查字段是否存在
-            if x_field not in df.columns:
-                raise ValueError(f"数据中不存在字段 '{x_field}'")
-            for y_field in y_fields:
-                if y_field not in df.columns:
-                    raise ValueError(f"数据中不存在字段 '{y_field}'")
+            # 直接提取列数组（同时检查字段是否存在）
+            columns = records_to_columns(data, [x_field, *y_fields])
             
             # 设置主题
             self._set_theme(theme)
             
             # 创建图形
-            plt.figure(figsize=figsize, dpi=dpi)
-            ax = plt.gca()
+            fig = self._get_figure(figsize, dpi)
+            ax = fig.add_subplot(111)
             
             # 准备默认值
             if line_styles is None:
@@ -92,25 +85,23 @@ class LineChart(PlottingBase):
             if markers is None:
                 markers = ['o'] * len(y_fields)
             
+            # 一次调用绘制所有线条（数值数据以二维数组传入，共享一次坐标变换）
+            x_values = columns[x_field]
+            series = [columns[y_field] for y_field in y_fields]
+            if all(column.dtype.kind in 'iuf' for column in series):
+                lines = ax.plot(x_values, np.column_stack(series), markersize=6)
+            else:
+                lines = [ax.plot(x_values, column, markersize=6)[0] for column in series]
+            
             # 为每条线应用不同的样式
-            for i, y_field in enumerate(y_fields):
-                # 获取当前线条的样式参数
-                color = colors[i] if colors and i < len(colors) else None
-                line_style = line_styles[i] if i < len(line_styles) else line_styles[0]
-                line_width = line_widths[i] if i < len(line_widths) else line_widths[0]
-                marker = markers[i] if i < len(markers) else markers[0]
-                
-                # 使用matplotlib的plot函数绘制线条，支持不同样式
-                ax.plot(
-                    df[x_field],
-                    df[y_field],
-                    label=y_field,
-                    color=color,
-                    linestyle=line_style,
-                    linewidth=line_width,
-                    marker=marker,
-                    markersize=6
-                )
+            for i, (line, y_field) in enumerate(zip(lines, y_fields)):
+                line.set_label(y_field)
+                # 未指定颜色时保留默认颜色循环分配的颜色
+                if colors and i < len(colors):
+                    line.set_color(colors[i])
+                line.set_linestyle(line_styles[i] if i < len(line_styles) else line_styles[0])
+                line.set_linewidth(line_widths[i] if i < len(line_widths) else line_widths[0])
+                line.set_marker(markers[i] if i < len(markers) else markers[0])
             
             # 设置标题和标签
             ax.set_title(title, fontsize=16)
@@ -129,15 +120,14 @@ class LineChart(PlottingBase):
             handles, labels = ax.get_legend_handles_labels()
             ax.legend(handles=handles, labels=labels, fontsize=10, loc='best', framealpha=0.8)
             
-            plt.tight_layout()
+            fig.tight_layout()
             
             # 保存图表
-            return self._save_plot(save_path, "line_chart")
+            return self._save_plot(save_path, "line_chart", fig)
         except Exception as e:
             logger.error(f"生成折线图失败: {str(e)}")
             # 确保清除当前图形
-            plt.clf()
-            plt.close()
+            self._clear_figure()
             raise
 
 
@@ -2,11 +2,16 @@
 # -*- coding: utf-8 -*-
 
 import os
+import asyncio
 import subprocess
-import tempfile
 import logging
-import uuid
-import mermaid
+import json
+import shutil
+import atexit
+import queue
+import threading
+from functools import lru_cache
+from typing import Literal, Optional
 from src.plotting_base import PlottingBase
 from src.utils.file_utils import ensure_directory, get_file_extension
 from src.utils.validation_utils import validate_chart_params
@@ -14,42 +19,240 @@ from src.utils.validation_utils import validate_chart_params
 # 获取logger实例
 logger = logging.getLogger(__name__)
 
+# 未指定保存路径时的默认输出目录
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'output')
 
-class MermaidChart(PlottingBase):
-    """Mermaid图生成器"""
+@lru_cache(maxsize=1)
+def _mmdc_available() -> bool:
+    """检查mmdc命令是否可用，每个进程只检测一次
     
-    def __init__(self, use_mmdc=None):
-        super().__init__()
-        # 检查mmdc命令是否可用
-        if use_mmdc is not None:
-            # 如果显式指定了use_mmdc参数，使用该参数值
-            self.mmdc_available = use_mmdc
-        else:
-            # 否则自动检测mmdc是否可用
-            self.mmdc_available = self._check_mmdc_availability()
+    只在PATH中查找命令，不启动mmdc（启动Node进程需要数百毫秒）
+    """
+    if shutil.which("mmdc") is None:
+        logger.warning("mmdc命令不可用，将使用mermaid-py作为替代")
+        return False
+    return True
+
+
+# 常驻渲染进程脚本
+MMDC_SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mmdc_server.mjs')
+
+# 常驻渲染进程支持的输出格式
+MMDC_SERVER_FORMATS = frozenset({'png', 'svg', 'pdf'})
+
+# 等待常驻渲染进程启动浏览器的超时时间（秒）
+MMDC_START_TIMEOUT = 30
+
+# 等待常驻渲染进程完成单张图渲染的超时时间（秒）
+MMDC_RENDER_TIMEOUT = 60
+
+# 关闭常驻渲染进程时等待其退出的超时时间（秒）
+MMDC_CLOSE_TIMEOUT = 5
+
+
+def _mermaid_cli_dir() -> Optional[str]:
+    """根据mmdc命令位置查找@mermaid-js/mermaid-cli的安装目录，找不到时返回None"""
+    mmdc_path = shutil.which("mmdc")
+    if not mmdc_path:
+        return None
+    path = os.path.realpath(mmdc_path)
+    while True:
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        if os.path.basename(path) == 'mermaid-cli' and os.path.basename(parent) == '@mermaid-js':
+            return path
+        path = parent
+
+
+class MmdcWorker:
+    """常驻的mmdc渲染进程，复用同一个浏览器实例，避免每张图重新启动Node和Chromium
     
-    def _check_mmdc_availability(self) -> bool:
-        """检查mmdc命令是否可用"""
+    进程在首次渲染时启动；无法启动或异常退出后不再使用，由调用方回退到每次调用mmdc命令。
+    标准输出由后台线程逐行读取，等待启动和渲染结果均有超时，渲染超时时终止进程，下次渲染时重新启动
+    """
+    
+    def __init__(self):
+        self._proc = None
+        self._responses = None
+        self._lock = threading.Lock()
+        self.available = True
+    
+    @staticmethod
+    def _read_stdout(stream, responses: queue.SimpleQueue) -> None:
+        """逐行读取渲染进程的标准输出，进程退出时放入None"""
         try:
-            subprocess.run(
-                ["mmdc", "--version"],
-                shell=True,
+            with stream:
+                for line in stream:
+                    responses.put(line)
+        except (OSError, ValueError):
+            pass
+        finally:
+            responses.put(None)
+    
+    @staticmethod
+    def _drain_stderr(stream) -> None:
+        """将渲染进程的标准错误输出写入日志，便于排查启动或渲染失败的原因"""
+        try:
+            with stream:
+                for line in stream:
+                    line = line.rstrip()
+                    if line:
+                        logger.warning("mmdc常驻渲染进程: %s", line)
+        except (OSError, ValueError):
+            pass
+    
+    def _read_line(self, timeout: float) -> str:
+        """读取渲染进程输出的一行
+        
+        Raises:
+            TimeoutError: 超时未收到输出时抛出
+            EOFError: 渲染进程已退出时抛出
+        """
+        try:
+            line = self._responses.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"{timeout}秒内未收到响应") from None
+        if line is None:
+            raise EOFError("渲染进程已退出")
+        return line
+    
+    def _start(self) -> bool:
+        """启动渲染进程并等待浏览器就绪"""
+        node_path = shutil.which("node")
+        cli_dir = _mermaid_cli_dir()
+        if not node_path or not cli_dir:
+            logger.debug("未找到node或mermaid-cli安装目录，不启用常驻渲染进程")
+            return False
+        try:
+            self._proc = subprocess.Popen(
+                [node_path, MMDC_SERVER_SCRIPT, cli_dir],
+                stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                check=True
+                text=True,
+                encoding='utf-8',
+                errors='replace',
+                bufsize=1
             )
-            return True
-        except (subprocess.SubprocessError, FileNotFoundError):
-            logger.warning("mmdc命令不可用，将使用mermaid-py作为替代")
+        except OSError as e:
+            logger.warning("启动mmdc常驻渲染进程失败: %s", e)
+            return False
+        
+        self._responses = queue.SimpleQueue()
+        threading.Thread(target=self._read_stdout, args=(self._proc.stdout, self._responses),
+                         name="mmdc-stdout", daemon=True).start()
+        threading.Thread(target=self._drain_stderr, args=(self._proc.stderr,),
+                         name="mmdc-stderr", daemon=True).start()
+        try:
+            if json.loads(self._read_line(MMDC_START_TIMEOUT)).get('ready'):
+                logger.info("mmdc常驻渲染进程已启动")
+                return True
+            logger.warning("mmdc常驻渲染进程未报告就绪状态")
+        except (OSError, ValueError, EOFError) as e:
+            logger.warning("启动mmdc常驻渲染进程失败: %s", e)
+        self.close(force=True)
+        return False
+    
+    def render(self, mermaid_code: str, save_path: str, width: int, height: int, theme: str) -> bool:
+        """通过常驻进程渲染Mermaid图
+        
+        Returns:
+            bool: 是否已由常驻进程完成渲染，返回False时调用方应改用mmdc命令
+            
+        Raises:
+            RuntimeError: 渲染进程报告渲染失败时抛出
+        """
+        output_format = get_file_extension(save_path).lower()
+        if not self.available or output_format not in MMDC_SERVER_FORMATS:
             return False
+        
+        with self._lock:
+            if self._proc is None and not self._start():
+                self.available = False
+                return False
+            request = {
+                "code": mermaid_code,
+                "output": os.path.abspath(save_path),
+                "format": output_format,
+                "width": width,
+                "height": height,
+                "theme": theme
+            }
+            try:
+                self._proc.stdin.write(json.dumps(request, ensure_ascii=False) + "\n")
+                self._proc.stdin.flush()
+                response = json.loads(self._read_line(MMDC_RENDER_TIMEOUT))
+            except TimeoutError as e:
+                # 浏览器可能已挂起，终止进程避免阻塞后续请求，下次渲染时重新启动
+                logger.warning("mmdc常驻渲染进程无响应，已终止并改用mmdc命令: %s", e)
+                self.close(force=True)
+                return False
+            except (OSError, ValueError, EOFError) as e:
+                logger.warning("mmdc常驻渲染进程异常退出，改用mmdc命令: %s", e)
+                self.close(force=True)
+                self.available = False
+                return False
+        
+        if not response.get("ok"):
+            raise RuntimeError(f"无法生成Mermaid图表: mmdc渲染失败 - {response.get('error')}")
+        return True
+    
+    def close(self, force: bool = False) -> None:
+        """关闭渲染进程
+        
+        Args:
+            force: 是否直接终止进程，不等待其关闭浏览器
+        """
+        proc, self._proc = self._proc, None
+        self._responses = None
+        if proc is None:
+            return
+        try:
+            if force:
+                proc.kill()
+            # 关闭标准输入后渲染进程会关闭浏览器并退出；标准输出和错误输出由读取线程关闭
+            proc.stdin.close()
+            proc.wait(timeout=MMDC_CLOSE_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired):
+            proc.kill()
+            proc.wait()
+
+
+# 每个进程共用一个常驻渲染进程
+mmdc_worker = MmdcWorker()
+atexit.register(mmdc_worker.close)
+
+
+class MermaidChart(PlottingBase):
+    """Mermaid图生成器"""
+    
+    def __init__(self, use_mmdc=None):
+        super().__init__()
+        # 显式指定use_mmdc参数时使用该参数值，否则在首次渲染时才检测mmdc命令
+        self._use_mmdc = use_mmdc
+    
+    @property
+    def mmdc_available(self) -> bool:
+        """mmdc命令是否可用（仅保存mmd代码时不会触发检测）"""
+        return _mmdc_available() if self._use_mmdc is None else self._use_mmdc
+    
+    @mmdc_available.setter
+    def mmdc_available(self, value: bool) -> None:
+        self._use_mmdc = value
+    
+    def _check_mmdc_availability(self) -> bool:
+        """检查mmdc命令是否可用（结果在进程内缓存）"""
+        return _mmdc_available()
     
     def generate(
         self,
         mermaid_code: str,
         save_path: str = None,
-        theme: str = "default",
+        theme: Literal["default", "dark", "forest", "neutral"] = "default",
         width: int = 800,
-        height: int = 600
+        height: int = 600,
+        _validated: bool = False
     ) -> str:
         """
         生成Mermaid图
@@ -64,32 +267,17 @@ class MermaidChart(PlottingBase):
             background_color: 背景颜色
             border_color: 边框颜色
             border_width: 边框宽度
+            _validated: 参数是否已由调用方验证（绘图服务流程中为True，跳过重复验证）
         
         返回:
             文件路径
         """
         try:
-            # 准备参数并使用全局验证函数验证
-            params = {
-                "mermaid_code": mermaid_code,
-                "save_path": save_path,
-                "theme": theme,
-                "width": width,
-                "height": height
-            }
+            save_path = self._prepare_save_path(mermaid_code, save_path, theme, width, height, _validated)
             
-            # 使用全局验证函数验证参数
-            validate_chart_params("mermaid_chart", params)
-            
-            # 处理保存路径
-            if not save_path:
-                # 如果没有指定保存路径，使用默认路径
-                default_output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'output')
-                ensure_directory(default_output_dir)
-                save_path = os.path.join(default_output_dir, f"mermaid_chart_{str(uuid.uuid4())[:8]}.png")
-            else:
-                # 确保目录存在
-                ensure_directory(os.path.dirname(save_path))
+            # mmd格式直接保存代码，无需渲染
+            if get_file_extension(save_path).lower() == "mmd":
+                return self._save_code(mermaid_code, save_path)
             
             # 使用mmdc命令或mermaid-py生成图表
             if self.mmdc_available:
@@ -101,39 +289,111 @@ class MermaidChart(PlottingBase):
             # logger.error(f"生成Mermaid图失败: {str(e)}")
             raise
     
+    async def generate_async(
+        self,
+        mermaid_code: str,
+        save_path: str = None,
+        theme: Literal["default", "dark", "forest", "neutral"] = "default",
+        width: int = 800,
+        height: int = 600,
+        _validated: bool = False
+    ) -> str:
+        """
+        异步生成Mermaid图，等待mmdc子进程期间不阻塞事件循环，多个请求可并发渲染
+        
+        参数与generate相同
+        
+        返回:
+            文件路径
+        """
+        save_path = self._prepare_save_path(mermaid_code, save_path, theme, width, height, _validated)
+        
+        # mmd格式直接保存代码，无需渲染
+        if get_file_extension(save_path).lower() == "mmd":
+            return self._save_code(mermaid_code, save_path)
+        
+        if self.mmdc_available:
+            return await self._generate_with_mmdc_async(mermaid_code, save_path, width, height, theme)
+        # mermaid-py为同步实现，放到线程中执行
+        return await asyncio.to_thread(self._generate_with_mermaid_py, mermaid_code, save_path, width, height)
+    
+    def _prepare_save_path(self, mermaid_code: str, save_path: str, theme: str, width: int, height: int,
+                           validated: bool = False) -> str:
+        """验证参数并确保保存目录存在
+        
+        参数:
+            validated: 参数是否已验证，为True时跳过验证
+        
+        返回:
+            最终的保存路径
+        """
+        if not validated:
+            # 准备参数并使用全局验证函数验证
+            params = {
+                "mermaid_code": mermaid_code,
+                "save_path": save_path,
+                "theme": theme,
+                "width": width,
+                "height": height
+            }
+            
+            # 使用全局验证函数验证参数
+            validate_chart_params("mermaid_chart", params)
+        
+        # 处理保存路径
+        if not save_path:
+            # 如果没有指定保存路径，使用默认路径
+            save_path = os.path.join(DEFAULT_OUTPUT_DIR, f"mermaid_chart_{os.urandom(4).hex()}.png")
+        # 确保目录存在；输出文件由mmdc写入，目录被外部删除时无法从其错误中区分，
+        # 因此每次都重新检查（相比外部渲染进程的开销可以忽略）
+        ensure_directory(os.path.dirname(save_path), recheck=True)
+        return save_path
+    
+    @staticmethod
+    def _save_code(mermaid_code: str, save_path: str) -> str:
+        """直接保存Mermaid代码"""
+        try:
+            with open(save_path, "w", encoding="utf-8") as f:
+                f.write(mermaid_code)
+        except OSError as e:
+            raise RuntimeError(f"无法生成Mermaid图表: {str(e)}")
+        logger.info(f"Mermaid代码已保存: {save_path}")
+        return save_path
+    
+    @staticmethod
+    def _build_mmdc_command(save_path: str, width: int, height: int, theme: str) -> list:
+        """构建mmdc命令参数，Mermaid代码通过标准输入传入
+        
+        使用mmdc的完整路径：Windows下mmdc为mmdc.cmd，不经过shell时无法只按命令名启动
+        """
+        return [
+            shutil.which("mmdc") or "mmdc",
+            "-i", "-",
+            "-o", save_path,
+            "--width", str(width),
+            "--height", str(height),
+            "--theme", theme
+        ]
+    
     def _generate_with_mmdc(self, mermaid_code: str, save_path: str, width: int, height: int, theme: str) -> str:
         """使用mmdc命令生成Mermaid图"""
+        # 优先使用常驻渲染进程
+        if mmdc_worker.render(mermaid_code, save_path, width, height, theme):
+            logger.info(f"Mermaid图已通过mmdc常驻进程生成: {save_path}")
+            return save_path
         try:
-            # 创建临时mmd文件
-            with tempfile.NamedTemporaryFile(suffix=".mmd", delete=False, mode="w", encoding="utf-8") as tmp_file:
-                tmp_file.write(mermaid_code)
-                tmp_file_path = tmp_file.name
-            
-            # 准备mmdc命令参数
-            cmd = [
-                "mmdc",
-                "-i", tmp_file_path,
-                "-o", save_path,
-                "--width", str(width),
-                "--height", str(height)
-            ]
-            
-            # 根据主题设置不同参数
-            cmd.extend(["--theme", theme])
-            
-            # 执行mmdc命令
+            # 执行mmdc命令（参数以列表传递，不经过shell；代码通过标准输入传入，无需临时文件）
             result = subprocess.run(
-                cmd,
-                shell=True,
+                self._build_mmdc_command(save_path, width, height, theme),
+                input=mermaid_code.encode('utf-8'),
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8'
+                timeout=MMDC_RENDER_TIMEOUT
             )
             
             # 检查命令执行结果
             if result.returncode != 0:
-                error_msg = f"无法生成Mermaid图表: mmdc命令执行失败 - {result.stderr}"
+                error_msg = f"无法生成Mermaid图表: mmdc命令执行失败 - {result.stderr.decode('utf-8', errors='replace')}"
                 # logger.error(error_msg)
                 raise RuntimeError(error_msg)
             
@@ -141,17 +401,53 @@ class MermaidChart(PlottingBase):
             return save_path
         except Exception as e:
             raise RuntimeError(f"无法生成Mermaid图表: 使用mmdc生成失败 - {str(e)}")
-        finally:
-            # 清理临时文件
-            if tmp_file_path and os.path.exists(tmp_file_path):
-                try:
-                    os.unlink(tmp_file_path)
-                except Exception as e:
-                    logger.warning(f"清理临时文件失败: {str(e)}")
+    
+    async def _generate_with_mmdc_async(self, mermaid_code: str, save_path: str, width: int, height: int,
+                                        theme: str) -> str:
+        """使用mmdc命令异步生成Mermaid图"""
+        # 优先使用常驻渲染进程（进程内按顺序处理请求，在线程中等待结果）
+        if await asyncio.to_thread(mmdc_worker.render, mermaid_code, save_path, width, height, theme):
+            logger.info(f"Mermaid图已通过mmdc常驻进程生成: {save_path}")
+            return save_path
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *self._build_mmdc_command(save_path, width, height, theme),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                _, stderr = await asyncio.wait_for(proc.communicate(mermaid_code.encode('utf-8')),
+                                                   MMDC_RENDER_TIMEOUT)
+            except asyncio.TimeoutError:
+                # 渲染卡住时终止mmdc进程，避免请求一直阻塞
+                proc.kill()
+                await proc.wait()
+                raise RuntimeError(f"mmdc命令执行超时（{MMDC_RENDER_TIMEOUT}秒）")
+            
+            # 检查命令执行结果
+            if proc.returncode != 0:
+                error_msg = f"无法生成Mermaid图表: mmdc命令执行失败 - {stderr.decode('utf-8', errors='replace')}"
+                raise RuntimeError(error_msg)
+            
+            logger.info(f"Mermaid图已通过mmdc命令生成: {save_path}")
+            return save_path
+        except Exception as e:
+            raise RuntimeError(f"无法生成Mermaid图表: 使用mmdc生成失败 - {str(e)}")
     
     def _generate_with_mermaid_py(self, mermaid_code: str, save_path: str, width: int, height: int) -> str:
         """使用mermaid-py库生成Mermaid图"""
+        # 根据文件扩展名选择不同的输出方式
+        ext = get_file_extension(save_path).lower()
+        
+        # mmd格式直接保存代码，避免mermaid-py构造时请求渲染服务
+        if ext == "mmd":
+            return self._save_code(mermaid_code, save_path)
+        
         try:
+            # mermaid-py仅在mmdc不可用时使用，按需导入以缩短模块加载时间
+            import mermaid
+            
             # 尝试使用mermaid-py渲染图表
             mermaid_chart = mermaid.Mermaid(mermaid_code)
             
@@ -161,9 +457,6 @@ class MermaidChart(PlottingBase):
                 mermaid_chart.render_to_file(save_path)
                 return save_path
             
-            # 根据文件扩展名选择不同的输出方式
-            ext = get_file_extension(save_path).lower()
-            
             if ext == "svg":
                 # 输出SVG文件
                 svg_content = mermaid_chart.mermaid_to_svg()
@@ -174,35 +467,19 @@ class MermaidChart(PlottingBase):
                 # mermaid-py没有直接保存为PNG的方法，需要先转为SVG再转换
                 svg_content = mermaid_chart.mermaid_to_svg()
                 
-                # 创建临时SVG文件
-                with tempfile.NamedTemporaryFile(suffix=".svg", delete=False, mode="w", encoding="utf-8") as tmp_svg_file:
-                    tmp_svg_file.write(svg_content)
-                    tmp_svg_path = tmp_svg_file.name
-                
+                # 使用cairosvg直接从SVG内容转换到PNG，无需临时文件
                 try:
-                    # 使用cairosvg转换SVG到PNG
-                    try:
-                        import cairosvg
-                        cairosvg.svg2png(url=tmp_svg_path, write_to=save_path, output_width=width, output_height=height)
-                    except ImportError:
-                        logger.warning("cairosvg库不可用，无法转换SVG到PNG")
-                        # 回退到保存SVG
-                        base_name = os.path.basename(save_path).split('.')[0]
-                        svg_path = os.path.join(os.path.dirname(save_path), f"{base_name}.svg")
-                        with open(svg_path, "w", encoding="utf-8") as f:
-                            f.write(svg_content)
-                        save_path = svg_path
-                finally:
-                    # 清理临时文件
-                    if tmp_svg_path and os.path.exists(tmp_svg_path):
-                        try:
-                            os.unlink(tmp_svg_path)
-                        except Exception as e:
-                            logger.warning(f"清理临时SVG文件失败: {str(e)}")
-            elif ext == "mmd":
-                # 直接保存Mermaid代码
-                with open(save_path, "w", encoding="utf-8") as f:
-                    f.write(mermaid_code)
+                    import cairosvg
+                    cairosvg.svg2png(bytestring=svg_content.encode("utf-8"), write_to=save_path,
+                                     output_width=width, output_height=height)
+                except ImportError:
+                    logger.warning("cairosvg库不可用，无法转换SVG到PNG")
+                    # 回退到保存SVG
+                    base_name = os.path.basename(save_path).split('.')[0]
+                    svg_path = os.path.join(os.path.dirname(save_path), f"{base_name}.svg")
+                    with open(svg_path, "w", encoding="utf-8") as f:
+                        f.write(svg_content)
+                    save_path = svg_path
             
             logger.info(f"Mermaid图已通过mermaid-py生成: {save_path}")
             return save_path
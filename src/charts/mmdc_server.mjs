@@ -0,0 +1,36 @@
+// 常驻的Mermaid渲染进程
+// 复用同一个浏览器实例，从标准输入逐行读取JSON渲染请求，每个请求回复一行JSON结果
+// 用法: node mmdc_server.mjs <@mermaid-js/mermaid-cli安装目录>
+import { createRequire } from 'node:module';
+import { writeFile } from 'node:fs/promises';
+import { join } from 'node:path';
+import { createInterface } from 'node:readline';
+import { pathToFileURL } from 'node:url';
+
+const reply = (message) => process.stdout.write(JSON.stringify(message) + '\n');
+
+const cliDir = process.argv[2];
+const requireFromCli = createRequire(join(cliDir, 'package.json'));
+const { renderMermaid } = await import(pathToFileURL(join(cliDir, 'src', 'index.js')).href);
+const { default: puppeteer } = await import(pathToFileURL(requireFromCli.resolve('puppeteer')).href);
+
+const browser = await puppeteer.launch({ headless: true });
+reply({ ready: true });
+
+// 请求按顺序逐个处理
+for await (const line of createInterface({ input: process.stdin })) {
+  try {
+    const { code, output, format, width, height, theme } = JSON.parse(line);
+    const { data } = await renderMermaid(browser, code, format, {
+      viewport: { width, height },
+      mermaidConfig: { theme },
+    });
+    await writeFile(output, data);
+    reply({ ok: true });
+  } catch (error) {
+    reply({ ok: false, error: String(error?.message ?? error) });
+  }
+}
+
+// 标准输入关闭（父进程退出）后关闭浏览器
+await browser.close();
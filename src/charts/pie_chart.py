@@ -1,12 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
 import logging
-from typing import List, Dict, Any, Optional
+from matplotlib.artist import setp
+from typing import List, Dict, Any, Optional, Tuple
 from src.plotting_base import PlottingBase
+from src.utils.frame_utils import records_to_columns
 
 # 获取logger实例
 logger = logging.getLogger(__name__)
@@ -32,7 +32,7 @@ class PieChart(PlottingBase):
         colors: List[str] = None,
         theme: str = "default",
         save_path: str = None,
-        figsize: tuple = (8, 8),
+        figsize: Tuple[float, float] = (8, 8),
         dpi: int = 100,
         legend: bool = True,
         legend_loc: str = 'right'
@@ -70,32 +70,27 @@ class PieChart(PlottingBase):
             if not value_field:
                 raise ValueError("数值字段名不能为空")
             
-            df = pd.DataFrame(data)
-            
-            # 检查字段是否存在
-            if name_field not in df.columns:
-                raise ValueError(f"数据中不存在字段 '{name_field}'")
-            if value_field not in df.columns:
-                raise ValueError(f"数据中不存在字段 '{value_field}'")
+            # 直接提取列数组（同时检查字段是否存在）
+            columns = records_to_columns(data, [name_field, value_field])
+            sizes = columns[value_field]
             
             # 检查数值是否都是非负数
-            if (df[value_field] < 0).any():
+            if sizes.min() < 0:
                 raise ValueError("饼图数据不能包含负值")
             
             # 检查数值是否都为零
-            if (df[value_field] == 0).all():
+            if not sizes.any():
                 raise ValueError("饼图数据不能全部为零")
             
             # 设置主题
             self._set_theme(theme)
             
             # 创建图形
-            plt.figure(figsize=figsize, dpi=dpi)
-            ax = plt.gca()
+            fig = self._get_figure(figsize, dpi)
+            ax = fig.add_subplot(111)
             
             # 准备数据
-            labels = df[name_field].tolist()
-            sizes = df[value_field].tolist()
+            labels = columns[name_field].tolist()
             
             # 设置默认值
             if explode is None:
@@ -121,14 +116,9 @@ class PieChart(PlottingBase):
             # 设置标题
             ax.set_title(title, fontsize=16)
             
-            # 设置百分比文本样式
-            for autotext in autotexts:
-                autotext.set_fontsize(10)
-                autotext.set_weight('bold')
-            
-            # 设置标签样式
-            for text in texts:
-                text.set_fontsize(10)
+            # 批量设置百分比文本和标签样式
+            setp(autotexts, fontsize=10, weight='bold')
+            setp(texts, fontsize=10)
             
             # 添加图例
             if legend and legend_loc:
@@ -139,15 +129,14 @@ class PieChart(PlottingBase):
             # 确保饼图是正圆形
             ax.axis('equal')
             
-            plt.tight_layout()
+            fig.tight_layout()
             
             # 保存图表
-            return self._save_plot(save_path, "pie_chart")
+            return self._save_plot(save_path, "pie_chart", fig)
         except Exception as e:
             logger.error(f"生成饼图失败: {str(e)}")
             # 确保清除当前图形
-            plt.clf()
-            plt.close()
+            self._clear_figure()
             raise
 
 
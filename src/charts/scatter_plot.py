@@ -1,17 +1,26 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
-import seaborn as sns
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from src.plotting_base import PlottingBase
+from src.utils.frame_utils import records_to_columns
 
 # 获取logger实例
 logger = logging.getLogger(__name__)
 
 
+def _color_values(column: np.ndarray) -> np.ndarray:
+    """将颜色字段转换为scatter可用的数值，分类值按出现顺序编码"""
+    if column.dtype != object:
+        return column
+    # factorize在C层完成编码，编码顺序与首次出现顺序一致
+    codes, _ = pd.factorize(column)
+    return codes
+
+
 class ScatterPlot(PlottingBase):
     """散点图生成器"""
     
@@ -33,7 +42,7 @@ class ScatterPlot(PlottingBase):
         alpha: float = 0.7,
         theme: str = "default",
         save_path: str = None,
-        figsize: tuple = (10, 6),
+        figsize: Tuple[float, float] = (10, 6),
         dpi: int = 100,
         grid: bool = True
     ) -> str:
@@ -70,29 +79,25 @@ class ScatterPlot(PlottingBase):
             if not y_field:
                 raise ValueError("Y轴字段名不能为空")
             
-            df = pd.DataFrame(data)
-            
-            # 检查字段是否存在
-            if x_field not in df.columns:
-                raise ValueError(f"数据中不存在字段 '{x_field}'")
-            if y_field not in df.columns:
-                raise ValueError(f"数据中不存在字段 '{y_field}'")
-            if color_field and color_field not in df.columns:
-                raise ValueError(f"数据中不存在字段 '{color_field}'")
-            if size_field and size_field not in df.columns:
-                raise ValueError(f"数据中不存在字段 '{size_field}'")
+            # 直接提取列数组（同时检查字段是否存在）
+            fields = [x_field, y_field]
+            if color_field:
+                fields.append(color_field)
+            if size_field:
+                fields.append(size_field)
+            columns = records_to_columns(data, fields)
             
             # 设置主题
             self._set_theme(theme)
             
             # 创建图形
-            plt.figure(figsize=figsize, dpi=dpi)
-            ax = plt.gca()
+            fig = self._get_figure(figsize, dpi)
+            ax = fig.add_subplot(111)
             
             # 准备散点图参数
             scatter_kwargs = {
-                'x': df[x_field],
-                'y': df[y_field],
+                'x': columns[x_field],
+                'y': columns[y_field],
                 'marker': marker_style,
                 'alpha': alpha,
                 'cmap': color_map
@@ -100,24 +105,19 @@ class ScatterPlot(PlottingBase):
             
             # 如果指定了颜色字段和大小字段
             if color_field and size_field:
-                # 检查颜色字段是否为分类类型，如果是则转换为数值编码
-                if pd.api.types.is_object_dtype(df[color_field]):
-                    # 将分类值映射到数值
-                    category_map = {cat: i for i, cat in enumerate(df[color_field].unique())}
-                    scatter_kwargs['c'] = df[color_field].map(category_map)
-                else:
-                    scatter_kwargs['c'] = df[color_field]
-                scatter_kwargs['s'] = df[size_field]
+                # 分类类型的颜色字段转换为数值编码
+                scatter_kwargs['c'] = _color_values(columns[color_field])
+                scatter_kwargs['s'] = columns[size_field]
                 sc = ax.scatter(**scatter_kwargs)
                 
                 # 添加颜色图例
-                cbar = plt.colorbar(sc, ax=ax)
+                cbar = fig.colorbar(sc, ax=ax)
                 cbar.set_label(color_field, fontsize=12)
                 
                 # 添加大小图例（自定义实现）
                 # 找到大小的最小、最大和中间值
-                min_size = df[size_field].min()
-                max_size = df[size_field].max()
+                min_size = np.nanmin(columns[size_field])
+                max_size = np.nanmax(columns[size_field])
                 mid_size = (min_size + max_size) / 2
                 
                 # 创建自定义图例
@@ -129,25 +129,20 @@ class ScatterPlot(PlottingBase):
                 ]
                 ax.legend(handles=legend_elements, title='Size', loc='best', framealpha=0.8)
             elif color_field:
-                # 检查颜色字段是否为分类类型，如果是则转换为数值编码
-                if pd.api.types.is_object_dtype(df[color_field]):
-                    # 将分类值映射到数值
-                    category_map = {cat: i for i, cat in enumerate(df[color_field].unique())}
-                    scatter_kwargs['c'] = df[color_field].map(category_map)
-                else:
-                    scatter_kwargs['c'] = df[color_field]
+                # 分类类型的颜色字段转换为数值编码
+                scatter_kwargs['c'] = _color_values(columns[color_field])
                 sc = ax.scatter(**scatter_kwargs)
                 
                 # 添加颜色图例
-                cbar = plt.colorbar(sc, ax=ax)
+                cbar = fig.colorbar(sc, ax=ax)
                 cbar.set_label(color_field, fontsize=12)
             elif size_field:
-                scatter_kwargs['s'] = df[size_field]
+                scatter_kwargs['s'] = columns[size_field]
                 ax.scatter(**scatter_kwargs)
                 
                 # 添加大小图例
-                min_size = df[size_field].min()
-                max_size = df[size_field].max()
+                min_size = np.nanmin(columns[size_field])
+                max_size = np.nanmax(columns[size_field])
                 mid_size = (min_size + max_size) / 2
                 
                 from matplotlib.lines import Line2D
@@ -173,15 +168,14 @@ class ScatterPlot(PlottingBase):
             if grid:
                 ax.grid(True, linestyle="--", alpha=0.5)
             
-            plt.tight_layout()
+            fig.tight_layout()
             
             # 保存图表
-            return self._save_plot(save_path, "scatter_plot")
+            return self._save_plot(save_path, "scatter_plot", fig)
         except Exception as e:
             logger.error(f"生成散点图失败: {str(e)}")
             # 确保清除当前图形
-            plt.clf()
-            plt.close()
+            self._clear_figure()
             raise
 
 
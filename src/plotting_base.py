@@ -1,65 +1,185 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import matplotlib
+# 服务端渲染使用非交互式Agg后端，避免初始化GUI后端
+# （需要交互式显示的调用方可在导入本模块后调用matplotlib.use切换后端）
+matplotlib.use("Agg")
+# 图表在复用的Figure上绘制，不经过pyplot管理，关闭打开图形数量的告警检查
+matplotlib.rcParams["figure.max_open_warning"] = 0
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image
 import os
+import re
 import logging
+import threading
+from types import MappingProxyType
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple
 # 导入字体工具
 from src.utils.font_utils import set_matplotlib_fonts
+from src.utils.file_utils import ensure_directory
 
 # 获取logger实例
 logger = logging.getLogger(__name__)
 
+# 可直接从Agg缓冲区导出的位图格式
+RASTER_FORMATS = {'png': 'PNG', 'jpg': 'JPEG', 'jpeg': 'JPEG'}
+
+# PNG的zlib压缩级别：图表以大面积纯色为主，低压缩级别编码速度显著更快，文件体积仅略有增加
+PNG_COMPRESS_LEVEL = 1
+
+# 字体设置成功后应用的全局样式参数
+GLOBAL_STYLE = {
+    "axes.labelweight": "bold",   # 坐标轴标签加粗
+    "axes.titleweight": "bold",   # 标题加粗
+    "axes.grid": True,            # 默认显示网格
+    "grid.alpha": 0.3,            # 网格透明度
+    "grid.linestyle": "--",       # 网格线型
+    "figure.facecolor": "white",  # 图形背景色
+    "figure.figsize": (10, 6),    # 默认图形大小
+}
+
+# 字体设置涉及的rcParams参数
+FONT_PARAMS = ("font.family", "font.sans-serif", "axes.unicode_minus")
+
+# 文件路径中不允许出现的字符
+_INVALID_PATH_CHARS = re.compile(r'[<>"|?*]')
+
+# 文件路径最大长度（不同系统有不同限制，这里设置一个合理的值）
+MAX_PATH_LENGTH = 4096
+
+# 每个线程复用一个Figure，避免每次请求重新创建画布
+_thread_local = threading.local()
+
+
+@lru_cache(maxsize=32)
+def _resolve_style(theme_name: str) -> Optional[Dict[str, Any]]:
+    """解析matplotlib内置主题对应的rcParams并缓存，避免每次渲染重复构建样式字典
+    
+    Args:
+        theme_name: 主题名称
+        
+    Returns:
+        Optional[Dict[str, Any]]: 主题的rcParams，非内置主题时返回None
+    """
+    if theme_name not in plt.style.library:
+        return None
+    return dict(plt.style.library[theme_name])
+
+
+def apply_style(theme_name: str) -> bool:
+    """应用matplotlib内置主题（使用缓存的样式字典）
+    
+    Args:
+        theme_name: 主题名称
+        
+    Returns:
+        bool: 是否为可用的内置主题
+    """
+    style = _resolve_style(theme_name)
+    if style is None:
+        return False
+    plt.rcParams.update(style)
+    return True
+
 
 class PlottingBase:
     """绘图基类，提供通用的绘图功能和工具方法"""
     
+    # 主题配置（只读，所有实例共享）
+    themes = MappingProxyType({
+        'default': MappingProxyType({
+            'axes.facecolor': 'white',
+            'axes.edgecolor': '#000000',
+            'text.color': '#000000',
+            'axes.labelcolor': '#000000',
+            'xtick.color': '#000000',
+            'ytick.color': '#000000',
+            'grid.color': '#cccccc',
+        })
+    })
+    
+    # 缓存字体信息：首次绘图时解析的字体及全局样式参数（进程内共享）
+    _font_cache = None
+    
+    # 当前进程最近一次应用的主题（rcParams为进程级全局状态，所有实例共享）
+    _active_theme = None
+    
+    # 保存时是否按内容裁剪边界（需要额外渲染一次）；图表已调用tight_layout，默认关闭
+    tight_bbox = False
+    
     def __init__(self):
-        # 初始化时设置字体
-        self._setup_fonts()
-        # 存储主题配置
-        self.themes = {
-            'default': {
-                'axes.facecolor': 'white',
-                'axes.edgecolor': '#000000',
-                'text.color': '#000000',
-                'axes.labelcolor': '#000000',
-                'xtick.color': '#000000',
-                'ytick.color': '#000000',
-                'grid.color': '#cccccc',
-            }
-        }
-        # 缓存字体信息
-        self._font_cache = None
+        # 字体在首次绘图时才设置，不绘制matplotlib图形的子类（如Mermaid图）无需查找字体
+        pass
     
     def _setup_fonts(self):
-        """设置matplotlib中文字体和全局样式"""
-        # 使用font_utils中的字体设置函数
-        success = set_matplotlib_fonts()
-        if success:
-            # 设置额外的全局样式参数
-            plt.rcParams["axes.labelweight"] = "bold"   # 坐标轴标签加粗
-            plt.rcParams["axes.titleweight"] = "bold"   # 标题加粗
-            plt.rcParams["axes.grid"] = True           # 默认显示网格
-            plt.rcParams["grid.alpha"] = 0.3           # 网格透明度
-            plt.rcParams["grid.linestyle"] = "--"       # 网格线型
-            plt.rcParams["figure.facecolor"] = "white"  # 图形背景色
-            plt.rcParams["figure.figsize"] = (10, 6)   # 默认图形大小
-        else:
-            logger.warning("字体设置失败，使用matplotlib默认配置")
+        """设置matplotlib中文字体和全局样式
+        
+        首次调用时查找字体并缓存解析结果，之后直接复用缓存一次性更新rcParams，
+        确保主题重置样式（如plt.style.use('default')）后字体设置仍然生效
+        """
+        if PlottingBase._font_cache is None:
+            # 使用font_utils中的字体设置函数
+            if set_matplotlib_fonts():
+                font_style = {key: plt.rcParams[key] for key in FONT_PARAMS}
+                PlottingBase._font_cache = {**font_style, **GLOBAL_STYLE}
+            else:
+                logger.warning("字体设置失败，使用matplotlib默认配置")
+                PlottingBase._font_cache = {}
+        plt.rcParams.update(PlottingBase._font_cache)
     
     def _set_theme(self, theme_name: str):
-        """设置图表主题
+        """设置图表主题，与当前已应用的主题相同时直接跳过
         
         Args:
             theme_name: 主题名称
         """
+        if theme_name == PlottingBase._active_theme:
+            return
+        
+        # 切换主题时先恢复matplotlib默认样式，避免上一个主题的参数残留
+        plt.style.use('default')
+        # 再应用字体和全局样式，主题中的同名参数优先
+        self._setup_fonts()
         if theme_name in self.themes:
-            for key, value in self.themes[theme_name].items():
-                plt.rcParams[key] = value
-        elif hasattr(plt.style, 'use') and theme_name in plt.style.available:
-            # 如果是matplotlib内置主题
-            plt.style.use(theme_name)
+            plt.rcParams.update(self.themes[theme_name])
+        elif not apply_style(theme_name):
+            # 既不是自定义主题也不是matplotlib内置主题，保持默认样式
+            logger.warning(f"主题 '{theme_name}' 不可用，使用默认主题")
+        PlottingBase._active_theme = theme_name
+    
+    def _get_figure(self, figsize: Tuple[float, float], dpi: int) -> Figure:
+        """获取当前线程复用的Figure，每次使用前清空并按参数调整尺寸
+        
+        Args:
+            figsize: 图形大小
+            dpi: 图像分辨率
+            
+        Returns:
+            Figure: 已清空的Figure
+        """
+        fig = getattr(_thread_local, 'figure', None)
+        if fig is None:
+            fig = Figure(figsize=figsize, dpi=dpi)
+            FigureCanvasAgg(fig)
+            _thread_local.figure = fig
+        else:
+            fig.clear()
+            fig.set_size_inches(figsize)
+            fig.set_dpi(dpi)
+            # 主题可能已切换，按当前rcParams刷新画布颜色
+            fig.set_facecolor(plt.rcParams["figure.facecolor"])
+            fig.set_edgecolor(plt.rcParams["figure.edgecolor"])
+        return fig
+    
+    def _clear_figure(self):
+        """清空当前线程复用的Figure"""
+        fig = getattr(_thread_local, 'figure', None)
+        if fig is not None:
+            fig.clear()
     
     def _validate_path(self, file_path: str) -> bool:
         """验证文件路径是否合法
@@ -73,23 +193,39 @@ class PlottingBase:
         if not file_path:
             return False
             
-        # 检查是否包含非法字符
-        invalid_chars = set('<>"|?*')
-        if any(char in invalid_chars for char in file_path):
+        # 检查路径长度
+        if len(file_path) > MAX_PATH_LENGTH:
             return False
             
-        # 检查路径长度（不同系统有不同限制，这里设置一个合理的值）
-        if len(file_path) > 4096:
+        # 检查是否包含非法字符
+        if _INVALID_PATH_CHARS.search(file_path):
             return False
             
         return True
         
-    def _save_plot(self, save_path: str = None, plot_type: str = "plot") -> str:
+    def _write_figure(self, fig: Figure, file_path: str) -> None:
+        """将Figure写入文件，格式由扩展名决定"""
+        ext = os.path.splitext(file_path)[1].lower().lstrip('.')
+        if ext in RASTER_FORMATS:
+            # 位图格式直接从Agg缓冲区导出，跳过savefig的二次渲染
+            fig.canvas.draw()
+            image = Image.frombuffer('RGBA', fig.canvas.get_width_height(),
+                                     fig.canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1)
+            if RASTER_FORMATS[ext] == 'JPEG':
+                image = image.convert('RGB')
+                image.save(file_path, 'JPEG', dpi=(fig.dpi, fig.dpi))
+            else:
+                image.save(file_path, 'PNG', dpi=(fig.dpi, fig.dpi), compress_level=PNG_COMPRESS_LEVEL)
+        else:
+            fig.savefig(file_path, dpi="figure", bbox_inches="tight" if self.tight_bbox else None)
+    
+    def _save_plot(self, save_path: Optional[str], plot_type: str, fig: Figure) -> str:
         """保存图表并返回文件路径
         
         Args:
-            save_path: 保存路径
+            save_path: 保存路径，为空时保存到当前目录下的"<图表类型>_output.png"
             plot_type: 图表类型
+            fig: 要保存的Figure
             
         Returns:
             str: 保存的文件绝对路径
@@ -99,25 +235,28 @@ class PlottingBase:
         """
         # 保存到文件
         file_path = save_path if save_path else f"{plot_type}_output.png"
-            
-        # 路径校验
+        
         try:
             # 检查路径是否合法
             if not self._validate_path(file_path):
                 raise ValueError(f"无效的文件路径: {file_path}")
             
-            # 确保目录存在
-            os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
-            
-            plt.savefig(file_path, dpi=100, bbox_inches="tight")
+            # 确保目录存在（已确认存在的目录直接跳过）
+            directory = os.path.dirname(os.path.abspath(file_path))
+            if not ensure_directory(directory):
+                raise ValueError(f"无法创建目录: {directory}")
             
-            # 清除当前图形
-            plt.clf()
-            plt.close()
+            try:
+                self._write_figure(fig, file_path)
+            except FileNotFoundError:
+                # 目录在确认存在后被外部删除（如清理输出目录），重新创建后再保存一次
+                if not ensure_directory(directory, recheck=True):
+                    raise ValueError(f"无法创建目录: {directory}")
+                self._write_figure(fig, file_path)
             
             return os.path.abspath(file_path)
-        except Exception as e:
-                # 清除当前图形
-                plt.clf()
-                plt.close()
-                raise ValueError(f"保存图表失败: {str(e)}")
+        except (OSError, ValueError) as e:
+            raise ValueError(f"保存图表失败: {str(e)}") from e
+        finally:
+            # 无论成功与否都释放图形内容
+            fig.clear()
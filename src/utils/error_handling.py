@@ -20,16 +20,16 @@ class PlottingError(Exception):
         self.expected = expected  # 期望值
         self.actual = actual  # 实际值
         
-        # 构建更详细的错误信息
-        detailed_message = f"[{error_code}] {message}"
+        # 构建更详细的错误信息，各部分一次性拼接
+        parts = [f"[{error_code}] {message}"]
         if field_name:
-            detailed_message += f" (字段: {field_name})"
+            parts.append(f" (字段: {field_name})")
         if expected is not None:
-            detailed_message += f" (期望: {expected})"
+            parts.append(f" (期望: {expected})")
         if actual is not None:
-            detailed_message += f" (实际: {actual})"
+            parts.append(f" (实际: {actual})")
         
-        super().__init__(detailed_message)
+        super().__init__("".join(parts))
         
     def to_dict(self) -> Dict[str, Any]:
         """将异常信息转换为字典格式"""
@@ -92,10 +92,7 @@ def handle_exception(exception: Exception, debug_mode: bool = False) -> Dict[str
         包含状态和错误信息的字典
     """
     # 记录异常到日志
-    logger.exception(f"发生异常: {str(exception)}")
-    
-    # 获取堆栈信息
-    stack_trace = traceback.format_exc()
+    logger.exception("发生异常: %s", exception)
     
     # 标准化错误响应
     if isinstance(exception, PlottingError):
@@ -118,9 +115,9 @@ def handle_exception(exception: Exception, debug_mode: bool = False) -> Dict[str
         "error_info": error_info
     }
     
-    # 在调试模式下添加堆栈信息
+    # 在调试模式下添加堆栈信息（仅在需要时格式化堆栈）
     if debug_mode:
-        response["stack_trace"] = stack_trace
+        response["stack_trace"] = traceback.format_exc()
     
     return response
 
@@ -133,6 +130,11 @@ def log_error(operation: str, error: Exception, additional_info: Optional[Dict[s
         error: 错误异常
         additional_info: 额外上下文信息
     """
+    # 根据错误类型确定日志级别，级别未启用时跳过日志内容的拼接
+    level = logging.WARNING if isinstance(error, ValidationError) else logging.ERROR
+    if not logger.isEnabledFor(level):
+        return
+    
     log_message = f"操作 '{operation}' 失败: {str(error)}"
     
     # 如果有额外信息，添加到日志
@@ -140,11 +142,7 @@ def log_error(operation: str, error: Exception, additional_info: Optional[Dict[s
         log_details = ", ".join([f"{k}={v}" for k, v in additional_info.items()])
         log_message += f" [详情: {log_details}]"
     
-    # 根据错误类型记录不同级别的日志
-    if isinstance(error, ValidationError):
-        logger.warning(log_message)
-    else:
-        logger.error(log_message)
+    logger.log(level, log_message)
 
 
 # 导出主要类和函数
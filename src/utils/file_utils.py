@@ -2,16 +2,18 @@
 # -*- coding: utf-8 -*-
 
 import os
-import uuid
+import re
 import logging
+import threading
+from types import MappingProxyType
 from typing import Optional, Dict, Any, Union
 
 # 获取logger实例
 logger = logging.getLogger(__name__)
 
 
-# 文件扩展名映射表
-IMAGE_EXTENSIONS = {
+# 文件扩展名映射表（只读）
+IMAGE_EXTENSIONS = MappingProxyType({
     'png': 'image/png',
     'jpg': 'image/jpeg',
     'jpeg': 'image/jpeg',
@@ -19,7 +21,7 @@ IMAGE_EXTENSIONS = {
     'pdf': 'application/pdf',
     'gif': 'image/gif',
     'bmp': 'image/bmp'
-}
+})
 
 # 支持的图表文件格式
 SUPPORTED_PLOT_FORMATS = ['png', 'jpg', 'jpeg', 'svg', 'pdf']
@@ -27,18 +29,39 @@ SUPPORTED_PLOT_FORMATS = ['png', 'jpg', 'jpeg', 'svg', 'pdf']
 # 支持的Mermaid文件格式
 SUPPORTED_MERMAID_FORMATS = ['png', 'svg', 'mmd']
 
+# 文件路径中不允许出现的字符
+_INVALID_CHARS_RE = re.compile(r'[<>":|?*]')
 
-def ensure_directory(path: str) -> bool:
+# 文件路径最大长度（不同系统有不同限制，这里设置一个合理的值）
+MAX_PATH_LENGTH = 4096
+
+# 已确认存在的目录，重复调用ensure_directory时跳过文件系统检查
+_seen_directories = set()
+_seen_directories_lock = threading.Lock()
+
+
+def ensure_directory(path: str, recheck: bool = False) -> bool:
     """确保目录存在，如果不存在则创建
     
     Args:
         path: 目录路径
+        recheck: 是否忽略已确认存在的记录重新检查（目录可能已被外部删除）
         
     Returns:
         bool: 操作是否成功
     """
+    # 空路径表示当前目录（如相对文件名的dirname），无需创建
+    if not path:
+        return True
+    if recheck:
+        with _seen_directories_lock:
+            _seen_directories.discard(path)
+    elif path in _seen_directories:
+        return True
     try:
         os.makedirs(path, exist_ok=True)
+        with _seen_directories_lock:
+            _seen_directories.add(path)
         return True
     except Exception as e:
         logger.error(f"创建目录失败 '{path}': {str(e)}")
@@ -59,16 +82,15 @@ def validate_file_path(file_path: str, allowed_extensions: Optional[list] = None
         logger.error("文件路径不能为空")
         return False
         
+    # 检查路径长度（开销最小的检查放在前面）
+    if len(file_path) > MAX_PATH_LENGTH:
+        logger.error(f"文件路径过长: {file_path}")
+        return False
+    
     # 检查是否包含非法字符
-    invalid_chars = set('<>":|?*')
-    if any(char in invalid_chars for char in file_path):
+    if _INVALID_CHARS_RE.search(file_path):
         logger.error(f"文件路径包含非法字符: {file_path}")
         return False
-        
-    # 检查路径长度（不同系统有不同限制，这里设置一个合理的值）
-    if len(file_path) > 4096:
-        logger.error(f"文件路径过长: {file_path}")
-        return False
     
     # 检查文件扩展名
     if allowed_extensions:
@@ -112,8 +134,8 @@ def generate_unique_filename(directory: str, base_name: str, extension: str) ->
     
     # 如果文件已存在，添加唯一标识符
     if os.path.exists(base_path):
-        # 使用UUID生成唯一标识符
-        unique_id = uuid.uuid4().hex[:8]
+        # 使用随机字节生成唯一标识符
+        unique_id = os.urandom(4).hex()
         base_path = os.path.join(directory, f"{base_name}_{unique_id}.{extension}")
     
     return base_path
@@ -134,7 +156,7 @@ def generate_temp_file(directory: str, prefix: str = 'temp', extension: str = 't
     ensure_directory(directory)
     
     # 生成唯一的临时文件名
-    unique_id = uuid.uuid4().hex[:8]
+    unique_id = os.urandom(4).hex()
     temp_file_path = os.path.join(directory, f"{prefix}_{unique_id}.{extension}")
     
     return temp_file_path
@@ -149,8 +171,8 @@ def get_file_mime_type(file_path: str) -> Optional[str]:
     Returns:
         Optional[str]: MIME类型，如果不支持则返回None
     """
-    ext = get_file_extension(file_path)
-    return IMAGE_EXTENSIONS.get(ext)
+    _, dot, ext = file_path.rpartition('.')
+    return IMAGE_EXTENSIONS.get(ext.lower()) if dot else None
 
 
 def delete_file_safely(file_path: str) -> bool:
@@ -162,13 +184,13 @@ def delete_file_safely(file_path: str) -> bool:
     Returns:
         bool: 删除是否成功
     """
-    if not os.path.exists(file_path):
-        return True
-        
     try:
         os.remove(file_path)
         logger.debug(f"文件已删除: {file_path}")
         return True
+    except FileNotFoundError:
+        # 文件不存在视为删除成功
+        return True
     except Exception as e:
         logger.warning(f"删除文件失败 '{file_path}': {str(e)}")
         return False
@@ -210,13 +232,12 @@ def read_text_file(file_path: str, encoding: str = 'utf-8') -> Optional[str]:
     Returns:
         Optional[str]: 文件内容，如果读取失败则返回None
     """
-    if not os.path.exists(file_path):
-        logger.error(f"文件不存在: {file_path}")
-        return None
-        
     try:
         with open(file_path, 'r', encoding=encoding) as f:
             return f.read()
+    except FileNotFoundError:
+        logger.error(f"文件不存在: {file_path}")
+        return None
     except Exception as e:
         logger.error(f"读取文本文件失败 '{file_path}': {str(e)}")
         return None
@@ -243,11 +264,10 @@ def get_file_size(file_path: str) -> Optional[int]:
     Returns:
         Optional[int]: 文件大小，如果文件不存在则返回None
     """
-    if not os.path.exists(file_path):
-        return None
-        
     try:
         return os.path.getsize(file_path)
+    except FileNotFoundError:
+        return None
     except Exception as e:
         logger.error(f"获取文件大小失败 '{file_path}': {str(e)}")
         return None
@@ -262,7 +282,8 @@ def is_file_readable(file_path: str) -> bool:
     Returns:
         bool: 文件是否可读
     """
-    return os.path.exists(file_path) and os.access(file_path, os.R_OK)
+    # 文件不存在时os.access同样返回False
+    return os.access(file_path, os.R_OK)
 
 
 def is_file_writable(file_path: str) -> bool:
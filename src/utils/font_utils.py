@@ -1,18 +1,39 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import matplotlib
 import matplotlib.font_manager as fm
 import os
+import re
 import json
 import logging
+from functools import lru_cache
 from typing import List, Tuple, Optional
 
+# orjson为可选依赖，用于加速字体缓存文件的读写
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # 获取logger实例
 logger = logging.getLogger(__name__)
 
 # 字体缓存文件路径
 FONT_CACHE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'cache', 'font_cache.json')
 
+# 字体缓存格式版本，缓存结构变化时递增以使旧缓存失效
+_FONT_CACHE_VERSION = 1
+
+# 系统字体目录，任一目录修改后字体缓存失效
+FONT_DIRECTORIES = [
+    *fm.X11FontDirectories,
+    *fm.OSXFontDirectories,
+    *fm.MSUserFontDirectories,
+    os.path.join(os.environ.get('WINDIR', r'C:\Windows'), 'Fonts'),
+    os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf'),
+]
+
 # 优先中文字体列表
 PREFERRED_FONTS = [
     'WenQuanYi Micro Hei',
@@ -25,6 +46,12 @@ PREFERRED_FONTS = [
     'NSimSun'
 ]
 
+# 中文字体文件名关键词（匹配小写文件名）
+_CHINESE_FILENAME_RE = re.compile(r'wqy|uming|hei|song|yahei|微软|黑体|宋体|楷体')
+
+# 字体名称中的中文字符
+_CJK_CHAR_RE = re.compile(r'[\u4e00-\u9fff]')
+
 
 def _ensure_cache_dir():
     """确保缓存目录存在"""
@@ -33,25 +60,50 @@ def _ensure_cache_dir():
         os.makedirs(cache_dir, exist_ok=True)
 
 
+def _font_cache_key() -> dict:
+    """生成字体缓存的校验信息：缓存版本、matplotlib版本和字体目录的最新修改时间"""
+    mtimes = [os.path.getmtime(d) for d in FONT_DIRECTORIES if os.path.isdir(d)]
+    return {
+        'version': _FONT_CACHE_VERSION,
+        'matplotlib': matplotlib.__version__,
+        'font_dirs_mtime': max(mtimes, default=0)
+    }
+
+
 def _load_font_cache() -> Optional[dict]:
-    """从缓存文件加载字体信息"""
+    """从缓存文件加载字体信息，校验信息不匹配时视为缓存失效"""
     if not os.path.exists(FONT_CACHE_FILE):
         return None
     
     try:
-        with open(FONT_CACHE_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        if orjson is not None:
+            with open(FONT_CACHE_FILE, 'rb') as f:
+                cache = orjson.loads(f.read())
+        else:
+            with open(FONT_CACHE_FILE, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
     except Exception as e:
         logger.warning(f"加载字体缓存失败: {str(e)}")
         return None
+    
+    if cache.get('key') != _font_cache_key():
+        logger.info("字体缓存已过期")
+        return None
+    return cache
 
 
 def _save_font_cache(cache_data: dict) -> None:
-    """保存字体信息到缓存文件"""
+    """保存字体信息到缓存文件（先写临时文件再替换，避免并发读取到不完整的缓存）"""
     try:
         _ensure_cache_dir()
-        with open(FONT_CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
+        tmp_file = f"{FONT_CACHE_FILE}.{os.getpid()}.tmp"
+        if orjson is not None:
+            with open(tmp_file, 'wb') as f:
+                f.write(orjson.dumps(cache_data, option=orjson.OPT_INDENT_2))
+        else:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(cache_data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, FONT_CACHE_FILE)
     except Exception as e:
         logger.warning(f"保存字体缓存失败: {str(e)}")
 
@@ -70,19 +122,13 @@ def find_system_fonts() -> List[Tuple[str, str]]:
     
     # 如果缓存不存在或已过期，重新扫描
     logger.info("扫描系统字体...")
-    fonts = []
     try:
-        for font_path in fm.findSystemFonts():
-            try:
-                font_name = fm.FontProperties(fname=font_path).get_name()
-                fonts.append((font_name, font_path))
-            except Exception as e:
-                # 忽略单个字体加载失败的情况
-                continue
+        # 直接使用matplotlib已解析的字体列表，无需重新遍历字体目录并逐个解析字体文件
+        fonts = [(font.name, font.fname) for font in fm.fontManager.ttflist]
         
         # 保存到缓存
         cache_data = {
-            'timestamp': os.path.getmtime(__file__),  # 使用当前文件的修改时间作为缓存时间戳
+            'key': _font_cache_key(),
             'fonts': [{'name': name, 'path': path} for name, path in fonts]
         }
         _save_font_cache(cache_data)
@@ -100,17 +146,10 @@ def find_chinese_fonts() -> List[Tuple[str, str]]:
     Returns:
         List[Tuple[str, str]]: 中文字体名称和字体路径的列表
     """
-    all_fonts = find_system_fonts()
-    chinese_fonts = []
-    
-    # 中文字体关键词
-    chinese_keywords = ['wqy', 'uming', 'hei', 'song', 'yahei', '微软', '黑体', '宋体', '楷体']
-    
-    for font_name, font_path in all_fonts:
-        font_filename = os.path.basename(font_path).lower()
-        if any(keyword in font_filename for keyword in chinese_keywords) or \
-           any(char > '\u4e00' and char < '\u9fff' for char in font_name):
-            chinese_fonts.append((font_name, font_path))
+    chinese_fonts = [
+        (font_name, font_path) for font_name, font_path in find_system_fonts()
+        if _CHINESE_FILENAME_RE.search(os.path.basename(font_path).lower()) or _CJK_CHAR_RE.search(font_name)
+    ]
     
     # 按首选字体列表排序
     def font_priority(font_tuple):
@@ -125,8 +164,9 @@ def find_chinese_fonts() -> List[Tuple[str, str]]:
     return chinese_fonts
 
 
+@lru_cache(maxsize=1)
 def get_preferred_chinese_font() -> Optional[Tuple[str, str]]:
-    """获取首选的中文字体
+    """获取首选的中文字体（结果在进程内缓存，字体只查找一次）
     
     Returns:
         Optional[Tuple[str, str]]: 首选字体名称和路径，如果没有找到则返回None
@@ -150,9 +190,11 @@ def set_matplotlib_fonts():
         try:
             # 设置matplotlib字体
             import matplotlib.pyplot as plt
-            plt.rcParams["font.family"] = [font_name]
-            plt.rcParams["font.sans-serif"] = [font_name]
-            plt.rcParams["axes.unicode_minus"] = False  # 解决负号显示问题
+            plt.rcParams.update({
+                "font.family": [font_name],
+                "font.sans-serif": [font_name],
+                "axes.unicode_minus": False  # 解决负号显示问题
+            })
             logger.info(f"已设置matplotlib字体为: {font_name} ({font_path})")
             return True
         except Exception as e:
@@ -162,9 +204,11 @@ def set_matplotlib_fonts():
     logger.info("使用默认中文字体配置")
     try:
         import matplotlib.pyplot as plt
-        plt.rcParams["font.family"] = PREFERRED_FONTS
-        plt.rcParams["font.sans-serif"] = PREFERRED_FONTS
-        plt.rcParams["axes.unicode_minus"] = False  # 解决负号显示问题
+        plt.rcParams.update({
+            "font.family": PREFERRED_FONTS,
+            "font.sans-serif": PREFERRED_FONTS,
+            "axes.unicode_minus": False  # 解决负号显示问题
+        })
         return True
     except Exception as e:
         logger.error(f"设置默认matplotlib字体失败: {str(e)}")
@@ -173,6 +217,7 @@ def set_matplotlib_fonts():
 
 def clear_font_cache():
     """清除字体缓存"""
+    get_preferred_chinese_font.cache_clear()
     if os.path.exists(FONT_CACHE_FILE):
         try:
             os.remove(FONT_CACHE_FILE)
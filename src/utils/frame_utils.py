@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""数据帧构建工具"""
+
+import hashlib
+import logging
+import pickle
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable
+
+import numpy as np
+import pandas as pd
+
+# 获取logger实例
+logger = logging.getLogger(__name__)
+
+# 数据帧缓存容量（原始数据帧、长格式数据和透视表共用）
+FRAME_CACHE_SIZE = 128
+
+# 按 (类型, 数据摘要, 构建参数...) 索引的数据帧缓存，按最近使用顺序淘汰；只保存构建结果，不保存原始数据
+_frame_cache: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+_frame_cache_lock = threading.Lock()
+
+
+def records_digest(data: Any) -> Optional[bytes]:
+    """计算记录列表的内容摘要，用作数据帧缓存和参数验证缓存的键
+
+    使用pickle序列化，保留值的类型（1、1.0和True互不相同）、字段顺序和缺失值的区别（None与NaN），
+    相同摘要的数据构建出的数据帧完全一致
+
+    Args:
+        data: 数据列表，每个元素是包含字段和值的字典
+
+    Returns:
+        Optional[bytes]: 16字节摘要，数据无法序列化时返回None
+    """
+    try:
+        payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return None
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+def cached_frame(key: tuple, build: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """从共享缓存中获取数据帧，未命中时调用build构建并缓存
+
+    注意：返回的DataFrame会被多次调用共享，调用方不应修改返回值
+
+    Args:
+        key: 缓存键，应包含数据摘要及影响构建结果的全部参数
+        build: 构建数据帧的函数
+
+    Returns:
+        pd.DataFrame: 数据帧
+    """
+    with _frame_cache_lock:
+        frame = _frame_cache.get(key)
+        if frame is not None:
+            _frame_cache.move_to_end(key)
+            return frame
+    frame = build()
+    with _frame_cache_lock:
+        _frame_cache[key] = frame
+        if len(_frame_cache) > FRAME_CACHE_SIZE:
+            _frame_cache.popitem(last=False)
+    return frame
+
+
+def records_to_frame(data: List[Dict[str, Any]], digest: Optional[bytes] = None) -> pd.DataFrame:
+    """将记录列表转换为DataFrame，相同数据重复请求时直接复用缓存
+
+    注意：返回的DataFrame可能被多次调用共享，调用方需要修改时应先copy()
+
+    Args:
+        data: 数据列表
+        digest: 调用方已计算的records_digest(data)，为None时自动计算
+
+    Returns:
+        pd.DataFrame: 数据帧
+    """
+    if digest is None:
+        digest = records_digest(data)
+    if digest is None:
+        logger.debug("数据无法序列化，跳过数据帧缓存")
+        return pd.DataFrame(data)
+    return cached_frame(('records', digest), lambda: pd.DataFrame(data))
+
+
+def ensure_fields(data: List[Dict[str, Any]], fields: List[str]) -> None:
+    """检查字段是否存在于数据中（与DataFrame列语义一致：任一数据项包含即视为存在）
+
+    Args:
+        data: 数据列表
+        fields: 需要检查的字段名列表
+
+    Raises:
+        ValueError: 所有数据项中都不存在某个字段时抛出
+    """
+    first = data[0]
+    for field in fields:
+        if field not in first and not any(field in item for item in data):
+            raise ValueError(f"数据中不存在字段 '{field}'")
+
+
+def records_to_columns(data: List[Dict[str, Any]], fields: List[str]) -> Dict[str, np.ndarray]:
+    """直接从记录列表提取指定字段的列数组，跳过DataFrame构建
+
+    数值字段提取为float64（整数字段为int64）数组，其他字段提取为object数组；
+    缺失的值与pandas保持一致，填充为NaN。
+
+    Args:
+        data: 数据列表
+        fields: 需要提取的字段名列表
+
+    Returns:
+        Dict[str, np.ndarray]: 字段名到列数组的映射
+
+    Raises:
+        ValueError: 所有数据项中都不存在某个字段时抛出
+    """
+    ensure_fields(data, fields)
+    
+    count = len(data)
+    first = data[0]
+    columns = {}
+    for field in fields:
+        if field in columns:
+            continue
+        sample = first.get(field)
+        if isinstance(sample, (int, float)) and not isinstance(sample, bool):
+            try:
+                column = np.fromiter((item.get(field, np.nan) for item in data),
+                                     dtype=np.float64, count=count)
+                # 整数字段在取值均为整数时保持整数类型，与pandas推断一致
+                if isinstance(sample, int) and np.array_equal(column, np.trunc(column)):
+                    column = column.astype(np.int64)
+                columns[field] = column
+                continue
+            except (TypeError, ValueError):
+                # 存在非数值项，退回object数组
+                pass
+        columns[field] = np.fromiter((item.get(field, np.nan) for item in data),
+                                     dtype=object, count=count)
+    return columns
@@ -1,7 +1,20 @@
 # -*- coding: utf-8 -*-
 
 import os
+import queue
+import atexit
 import logging
+import logging.handlers
+import multiprocessing
+
+# 控制台和日志文件处理器，工作进程转发来的日志复用同一组处理器写入
+_output_handlers = []
+
+# 单个日志文件的最大字节数，超过后轮转
+LOG_MAX_BYTES = 10 * 1024 * 1024
+
+# 保留的历史日志文件数
+LOG_BACKUP_COUNT = 5
 
 
 def setup_logging():
@@ -25,13 +38,19 @@ def setup_logging():
         
         # 首先创建logger实例，避免循环引用
         logger = logging.getLogger('PlottingService')
-        logger.setLevel(logging.DEBUG)  # 默认直接设置为DEBUG级别，确保所有日志都能被捕获
+        # 默认为INFO级别，DEBUG日志（含完整请求参数）只在--debug调试模式下记录，避免每次请求格式化整个数据列表
+        logger.setLevel(logging.INFO)
         logger.propagate = False  # 防止日志传播到root logger
         
         # 清除已有的处理器
         if logger.handlers:
             logger.handlers.clear()
         
+        # 工作进程不打开日志文件，由进程池初始化函数init_worker_logging将日志转发给主进程
+        # spawn启动的子进程在导入主模块前即已设置进程名，而parent_process()要到导入之后才可用
+        if multiprocessing.current_process().name != 'MainProcess':
+            return logger
+        
         # 创建格式化器，添加更多信息
         formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s')
         
@@ -40,6 +59,11 @@ def setup_logging():
         console_handler.setLevel(logging.INFO)  # 控制台默认只显示INFO及以上
         console_handler.setFormatter(formatter)
         logger.addHandler(console_handler)
+        _output_handlers.append(console_handler)
+        
+        # 文件处理器由后台线程写入，记录日志时只需入队，避免磁盘IO阻塞请求处理；
+        # 只有主进程打开日志文件，可以安全地按大小轮转
+        file_handlers = []
         
         # 主日志文件处理器 - 记录所有级别日志
         main_file_path = os.path.join(log_dir, 'plotting_service.log')
@@ -48,10 +72,11 @@ def setup_logging():
             with open(main_file_path, 'a') as f:
                 f.write("\n--- 服务重启日志记录开始 ---")
             
-            main_file_handler = logging.FileHandler(main_file_path, encoding='utf-8')
-            main_file_handler.setLevel(logging.DEBUG)  # 记录所有级别日志
+            main_file_handler = logging.handlers.RotatingFileHandler(
+                main_file_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+            main_file_handler.setLevel(logging.DEBUG)  # 记录logger放行的所有级别日志
             main_file_handler.setFormatter(formatter)
-            logger.addHandler(main_file_handler)
+            file_handlers.append(main_file_handler)
         except Exception as e:
             print(f"配置主日志文件失败: {str(e)}")
         
@@ -62,13 +87,23 @@ def setup_logging():
             with open(error_file_path, 'a') as f:
                 f.write("\n--- 服务重启错误日志记录开始 ---")
             
-            error_file_handler = logging.FileHandler(error_file_path, encoding='utf-8')
+            error_file_handler = logging.handlers.RotatingFileHandler(
+                error_file_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
             error_file_handler.setLevel(logging.ERROR)  # 只记录错误及以上
             error_file_handler.setFormatter(formatter)
-            logger.addHandler(error_file_handler)
+            file_handlers.append(error_file_handler)
         except Exception as e:
             print(f"配置错误日志文件失败: {str(e)}")
         
+        _output_handlers.extend(file_handlers)
+        if file_handlers:
+            log_queue = queue.SimpleQueue()
+            logger.addHandler(logging.handlers.QueueHandler(log_queue))
+            listener = logging.handlers.QueueListener(log_queue, *file_handlers, respect_handler_level=True)
+            listener.start()
+            # 进程退出时写完队列中剩余的日志
+            atexit.register(listener.stop)
+        
         # 配置第三方库的日志级别，避免过多调试信息
         logging.getLogger('mcp').setLevel(logging.WARNING)
         logging.getLogger('fastapi').setLevel(logging.WARNING)
@@ -86,7 +121,7 @@ def setup_logging():
         print(f"日志系统初始化失败: {str(e)}")
         # 创建一个简单的备用日志记录器，确保至少有日志输出
         logger = logging.getLogger('PlottingService')
-        logger.setLevel(logging.DEBUG)
+        logger.setLevel(logging.INFO)
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.DEBUG)
         logger.addHandler(console_handler)
@@ -94,5 +129,34 @@ def setup_logging():
         return logger
 
 
+def create_worker_log_queue(context):
+    """创建工作进程的日志队列，并在主进程的后台线程中将其中的日志写入控制台和日志文件
+    
+    Args:
+        context: 工作进程使用的multiprocessing上下文
+        
+    Returns:
+        可传给工作进程的日志队列
+    """
+    log_queue = context.Queue()
+    listener = logging.handlers.QueueListener(log_queue, *_output_handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return log_queue
+
+
+def init_worker_logging(log_queue, level: int) -> None:
+    """工作进程初始化函数：日志只入队，由主进程统一写入，避免多个进程同时打开同一组日志文件
+    
+    Args:
+        log_queue: create_worker_log_queue创建的日志队列
+        level: 与主进程一致的日志级别
+    """
+    logger = logging.getLogger('PlottingService')
+    logger.handlers.clear()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(level)
+
+
 # 初始化日志系统并导出logger实例
 logger = setup_logging()
\ No newline at end of file
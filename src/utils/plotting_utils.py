@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
 
 import inspect
+import logging
 import traceback
 import importlib
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
 from typing import Dict, Any, Tuple, Optional, Callable, Union
 
 # 导入日志配置
@@ -46,9 +51,16 @@ class ChartConfig:
             'mermaid_chart': {
                 'module': 'src.charts.mermaid_chart',
                 'class_name': 'MermaidChart',
-                'required_params': ['mermaid_code']
+                'required_params': ['mermaid_code'],
+                # 渲染由外部进程完成，在事件循环中异步执行
+                'async_method': 'generate_async'
             }
         }
+        # 缓存已加载的图表类，按图表类型索引
+        self._chart_classes: Dict[str, type] = {}
+        # 缓存已实例化的绘图函数及其签名，按图表类型索引
+        self._targets: Dict[str, Tuple[Callable, inspect.Signature]] = {}
+        self._async_targets: Dict[str, Tuple[Callable, inspect.Signature]] = {}
         
     @property
     def supported_chart_types(self) -> list:
@@ -61,10 +73,11 @@ class ChartConfig:
         
     def get_chart_config(self, chart_type: str) -> Dict[str, Any]:
         """获取图表类型的配置信息"""
-        if not self.is_supported(chart_type):
+        try:
+            return self._chart_types[chart_type]
+        except KeyError:
             supported_types = ', '.join(self.supported_chart_types)
-            raise ValueError(f"不支持的图表类型: {chart_type}。支持的类型有: {supported_types}")
-        return self._chart_types[chart_type]
+            raise ValueError(f"不支持的图表类型: {chart_type}。支持的类型有: {supported_types}") from None
         
     def get_required_params(self, chart_type: str) -> list:
         """获取图表类型的必需参数列表"""
@@ -72,30 +85,62 @@ class ChartConfig:
         return config.get('required_params', [])
         
     def get_chart_class(self, chart_type: str) -> type:
-        """动态加载并返回图表类"""
+        """动态加载并返回图表类，首次加载后缓存复用"""
+        chart_class = self._chart_classes.get(chart_type)
+        if chart_class is not None:
+            return chart_class
         config = self.get_chart_config(chart_type)
         try:
             module = importlib.import_module(config['module'])
             chart_class = getattr(module, config['class_name'])
+            self._chart_classes[chart_type] = chart_class
             return chart_class
         except ImportError as e:
-            logger.error(f"无法导入图表模块 {config['module']}: {str(e)}")
+            logger.error("无法导入图表模块 %s: %s", config['module'], e)
             raise ChartGenerationError(f"无法加载图表类型 '{chart_type}' 的实现模块") from e
         except AttributeError as e:
-            logger.error(f"在模块 {config['module']} 中找不到类 {config['class_name']}: {str(e)}")
+            logger.error("在模块 %s 中找不到类 %s: %s", config['module'], config['class_name'], e)
             raise ChartGenerationError(f"无法找到图表类型 '{chart_type}' 的实现类") from e
             
+    def get_target(self, chart_type: str) -> Tuple[Callable, inspect.Signature]:
+        """获取图表类型的generate方法及其签名，首次调用后缓存复用"""
+        target = self._targets.get(chart_type)
+        if target is None:
+            chart_instance = self.get_chart_class(chart_type)()
+            target_func = chart_instance.generate
+            target = (target_func, inspect.signature(target_func))
+            self._targets[chart_type] = target
+        return target
+    
+    def is_async(self, chart_type: str) -> bool:
+        """检查图表类型是否提供异步生成方法"""
+        return 'async_method' in self._chart_types.get(chart_type, {})
+    
+    def get_async_target(self, chart_type: str) -> Tuple[Callable, inspect.Signature]:
+        """获取图表类型的异步生成方法及其签名，与generate共用同一实例"""
+        target = self._async_targets.get(chart_type)
+        if target is None:
+            chart_instance = self.get_target(chart_type)[0].__self__
+            target_func = getattr(chart_instance, self.get_chart_config(chart_type)['async_method'])
+            target = (target_func, inspect.signature(target_func))
+            self._async_targets[chart_type] = target
+        return target
+            
     def register_chart_type(self, chart_type: str, module_path: str, class_name: str, required_params: list) -> None:
         """注册新的图表类型，用于扩展功能"""
         if self.is_supported(chart_type):
-            logger.warning(f"图表类型 '{chart_type}' 已存在，将被覆盖")
+            logger.warning("图表类型 '%s' 已存在，将被覆盖", chart_type)
         
         self._chart_types[chart_type] = {
             'module': module_path,
             'class_name': class_name,
             'required_params': required_params
         }
-        logger.info(f"成功注册新的图表类型: {chart_type}")
+        # 清除旧实现的缓存
+        self._chart_classes.pop(chart_type, None)
+        self._targets.pop(chart_type, None)
+        self._async_targets.pop(chart_type, None)
+        logger.info("成功注册新的图表类型: %s", chart_type)
 
 # 创建全局ChartConfig实例
 chart_config = ChartConfig()
@@ -108,21 +153,75 @@ def process_nested_params(params: Any) -> Dict[str, Any]:
         logger.debug("参数嵌套结构处理完成")
         return result
     except Exception as e:
-        logger.error(f"处理嵌套参数时出错: {str(e)}")
+        logger.error("处理嵌套参数时出错: %s", e)
         raise ValidationError(f"参数格式错误: {str(e)}") from e
 
 
-def validate_parameters(plot_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
-    """验证图表参数"""
+# 已通过验证的参数摘要缓存容量
+VALIDATION_CACHE_SIZE = 512
+
+# 已通过验证的参数摘要，按 (图表类型, 摘要) 索引，按最近使用顺序淘汰
+_validated_params: "OrderedDict[Tuple[str, bytes], None]" = OrderedDict()
+_validated_params_lock = threading.Lock()
+
+
+def params_digest(params: Dict[str, Any], data_digest: Optional[bytes] = None) -> Optional[bytes]:
+    """计算参数字典的内容摘要
+    
+    data字段使用调用方已计算的数据摘要（与数据帧缓存共用），其余参数体量很小，直接序列化
+    
+    Args:
+        params: 参数字典
+        data_digest: records_digest(params['data'])的结果，参数中不含data时忽略
+        
+    Returns:
+        Optional[bytes]: 摘要，参数无法序列化时返回None
+    """
+    if 'data' in params and data_digest is None:
+        return None
+    try:
+        payload = pickle.dumps((sorted((k, v) for k, v in params.items() if k != 'data'), data_digest),
+                               protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return None
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+def validate_parameters(plot_type: str, params: Dict[str, Any],
+                        data_digest: Optional[bytes] = None) -> Dict[str, Any]:
+    """验证图表参数，相同参数重复请求时跳过验证
+    
+    Args:
+        plot_type: 图表类型
+        params: 图表参数字典
+        data_digest: 调用方已计算的数据摘要，未提供时不使用验证缓存
+        
+    Returns:
+        Dict[str, Any]: 验证后的参数字典
+    """
+    digest = params_digest(params, data_digest)
+    cache_key = (plot_type, digest)
+    if digest is not None:
+        with _validated_params_lock:
+            if cache_key in _validated_params:
+                _validated_params.move_to_end(cache_key)
+                logger.debug("图表类型 '%s' 的参数命中验证缓存", plot_type)
+                return params
+    
     try:
         result = validate_chart_params(plot_type, params)
-        logger.debug(f"图表类型 '{plot_type}' 的参数验证通过")
+        logger.debug("图表类型 '%s' 的参数验证通过", plot_type)
+        if digest is not None:
+            with _validated_params_lock:
+                _validated_params[cache_key] = None
+                if len(_validated_params) > VALIDATION_CACHE_SIZE:
+                    _validated_params.popitem(last=False)
         return result
     except ValidationError:
         # 已经在validate_chart_params中记录了日志，这里直接重新抛出
         raise
     except Exception as e:
-        logger.error(f"参数验证过程中发生未预期错误: {str(e)}")
+        logger.error("参数验证过程中发生未预期错误: %s", e)
         raise ValidationError(f"参数验证失败: {str(e)}") from e
 
 
@@ -134,37 +233,52 @@ def get_target_function(plot_type: str, plot_func: Optional[Callable] = None) ->
             target_func = plot_func
             target_sig = inspect.signature(target_func)
         else:
-            # 否则从chart_config获取并实例化图表类
-            chart_class = chart_config.get_chart_class(plot_type)
-            # 实例化图表类
-            chart_instance = chart_class()
-            # 获取实例的generate方法
-            target_func = chart_instance.generate
-            target_sig = inspect.signature(target_func)
+            # 否则从chart_config获取缓存的generate方法及签名
+            target_func, target_sig = chart_config.get_target(plot_type)
             
-        logger.debug(f"获取图表类型 '{plot_type}' 的目标函数成功")
+        logger.debug("获取图表类型 '%s' 的目标函数成功", plot_type)
         return target_func, target_sig
     except Exception as e:
-        logger.error(f"获取目标函数时出错: {str(e)}")
+        logger.error("获取目标函数时出错: %s", e)
         raise ChartGenerationError(f"无法获取图表生成函数: {str(e)}") from e
 
 
 def filter_kwargs(params: Dict[str, Any], signature: inspect.Signature) -> Dict[str, Any]:
     """过滤掉函数不接受的参数"""
-    # 获取签名中的参数名列表
-    valid_param_names = list(signature.parameters.keys())
-    # 过滤参数
+    # 签名参数表为映射，直接用于O(1)成员判断
+    valid_param_names = signature.parameters
     filtered_params = {k: v for k, v in params.items() if k in valid_param_names}
     
-    # 检查是否有被过滤掉的参数并记录日志
-    filtered_keys = [k for k in params.keys() if k not in valid_param_names]
-    if filtered_keys:
-        logger.debug(f"过滤掉不支持的参数: {filtered_keys}")
-    
-    logger.debug(f"过滤后的参数: {filtered_params}")
+    # 被过滤掉的参数列表仅在调试日志启用时构建
+    if logger.isEnabledFor(logging.DEBUG):
+        filtered_keys = [k for k in params if k not in valid_param_names]
+        if filtered_keys:
+            logger.debug("过滤掉不支持的参数: %s", filtered_keys)
+        logger.debug("过滤后的参数: %s", filtered_params)
     return filtered_params
 
 
+def _parameter_error(error: TypeError, filtered_params: Dict[str, Any], target_sig: inspect.Signature) -> ValidationError:
+    """根据函数签名生成参数不匹配的详细错误"""
+    signature_params = target_sig.parameters
+    target_params = list(signature_params)
+    # 直接在映射上做成员判断，避免对列表逐个扫描
+    unexpected_params = [p for p in filtered_params if p not in signature_params]
+    missing_params = [name for name, param in signature_params.items()
+                      if name not in filtered_params
+                      and param.default is inspect.Parameter.empty]
+    
+    error_msg = f"参数错误: {str(error)}\n"
+    if unexpected_params:
+        error_msg += f"意外的参数: {', '.join(unexpected_params)}\n"
+    if missing_params:
+        error_msg += f"缺少必需参数: {', '.join(missing_params)}\n"
+    error_msg += f"可用参数列表: {', '.join(target_params)}"
+    
+    logger.error(error_msg)
+    return ValidationError(error_msg)
+
+
 def execute_plotting(plot_func: Callable, filtered_params: Dict[str, Any], target_sig: inspect.Signature) -> Any:
     """执行绘图函数并处理参数不匹配错误"""
     try:
@@ -174,24 +288,24 @@ def execute_plotting(plot_func: Callable, filtered_params: Dict[str, Any], targe
         return result
     except TypeError as e:
         # 提供详细的参数错误信息
-        target_params = list(target_sig.parameters.keys())
-        provided_params = list(filtered_params.keys())
-        unexpected_params = [p for p in provided_params if p not in target_params]
-        missing_params = [p for p in target_params 
-                         if p not in provided_params 
-                         and target_sig.parameters[p].default == inspect.Parameter.empty]
-        
-        error_msg = f"参数错误: {str(e)}\n"
-        if unexpected_params:
-            error_msg += f"意外的参数: {', '.join(unexpected_params)}\n"
-        if missing_params:
-            error_msg += f"缺少必需参数: {', '.join(missing_params)}\n"
-        error_msg += f"可用参数列表: {', '.join(target_params)}"
-        
-        logger.error(error_msg)
-        raise ValidationError(error_msg) from e
+        raise _parameter_error(e, filtered_params, target_sig) from e
+    except Exception as e:
+        logger.error("执行图表生成函数时发生错误: %s", e)
+        raise ChartGenerationError(f"图表生成失败: {str(e)}") from e
+
+
+async def execute_plotting_async(plot_func: Callable, filtered_params: Dict[str, Any],
+                                 target_sig: inspect.Signature) -> Any:
+    """执行异步绘图函数，错误处理与execute_plotting一致"""
+    try:
+        logger.debug("开始执行异步图表生成函数")
+        result = await plot_func(**filtered_params)
+        logger.info("图表生成成功")
+        return result
+    except TypeError as e:
+        raise _parameter_error(e, filtered_params, target_sig) from e
     except Exception as e:
-        logger.error(f"执行图表生成函数时发生错误: {str(e)}")
+        logger.error("执行图表生成函数时发生错误: %s", e)
         raise ChartGenerationError(f"图表生成失败: {str(e)}") from e
 
 
@@ -209,47 +323,102 @@ def get_chart_instance(chart_type: str, **kwargs) -> Any:
     try:
         chart_class = chart_config.get_chart_class(chart_type)
         instance = chart_class(**kwargs)
-        logger.debug(f"创建图表类型 '{chart_type}' 的实例成功")
+        logger.debug("创建图表类型 '%s' 的实例成功", chart_type)
         return instance
     except Exception as e:
-        logger.error(f"创建图表实例时出错: {str(e)}")
+        logger.error("创建图表实例时出错: %s", e)
         raise ChartGenerationError(f"无法创建图表实例: {str(e)}") from e
 
 
-# 全局变量，用于跟踪字体是否已设置
-_fonts_initialized = False
+def _prepare_plotting_call(plot_type: str, params: Dict[str, Any],
+                           use_async: bool = False) -> Tuple[Callable, Dict[str, Any], inspect.Signature]:
+    """处理并验证请求参数，返回绘图函数、过滤后的参数及函数签名"""
+    # 处理嵌套参数结构
+    params = process_nested_params(params)
+    logger.debug("处理后的参数: %s", params)
+    
+    # 检查图表类型支持
+    if not chart_config.is_supported(plot_type):
+        supported_types = ', '.join(chart_config.supported_chart_types)
+        raise ValidationError(f"不支持的图表类型: {plot_type}。支持的类型有: {supported_types}")
+    
+    # 数据摘要只计算一次，同时用于验证缓存和图表的数据帧缓存
+    data = params.get('data')
+    data_digest = None
+    if isinstance(data, list):
+        # frame_utils依赖pandas，在需要时才导入，避免拖慢主进程启动
+        from src.utils.frame_utils import records_digest
+        data_digest = records_digest(data)
+    
+    # 验证参数
+    validate_parameters(plot_type, params, data_digest)
+    
+    # 主题由各图表在绘制前通过PlottingBase._set_theme设置，主题未变化时不重复更新rcParams
+    
+    # 获取绘图函数和过滤参数
+    if use_async:
+        try:
+            target_func, target_sig = chart_config.get_async_target(plot_type)
+        except Exception as e:
+            logger.error("获取目标函数时出错: %s", e)
+            raise ChartGenerationError(f"无法获取图表生成函数: {str(e)}") from e
+    else:
+        target_func, target_sig = get_target_function(plot_type)
+    filtered_params = filter_kwargs(params, target_sig)
+    # 参数已在上方验证，支持的绘图函数跳过内部的重复验证
+    if '_validated' in target_sig.parameters:
+        filtered_params['_validated'] = True
+    # 始终覆盖请求中可能携带的同名参数，避免伪造摘要命中其他数据的缓存
+    if '_data_digest' in target_sig.parameters:
+        filtered_params['_data_digest'] = data_digest
+    return target_func, filtered_params, target_sig
+
 
-def setup_chart_theme(theme: Optional[str] = None) -> None:
-    """设置图表主题
+def run_plotting_task(plot_type: str, params: Dict[str, Any], debug_mode: bool = False) -> Dict[str, Any]:
+    """执行完整的图表生成流程并返回MCP响应
     
-    注意：字体设置只在首次调用时执行，之后不再重复设置
+    可在工作进程中执行，返回值只包含可序列化的字典
+    
+    Args:
+        plot_type: 图表类型
+        params: 原始请求参数
+        debug_mode: 是否启用调试模式
+        
+    Returns:
+        Dict[str, Any]: 包含图表保存路径和状态的响应
     """
-    global _fonts_initialized
+    try:
+        target_func, filtered_params, target_sig = _prepare_plotting_call(plot_type, params)
+        
+        # 执行绘图
+        logger.info("开始生成图表，图表类型: %s", plot_type)
+        result = execute_plotting(target_func, filtered_params, target_sig)
+        
+        logger.info("图表生成成功，保存路径: %s", result)
+        return {"status": "success", "message": "图表生成成功", "save_path": result}
+    except Exception as e:
+        return handle_plotting_exception(e, debug_mode)
+
+
+async def run_plotting_task_async(plot_type: str, params: Dict[str, Any], debug_mode: bool = False) -> Dict[str, Any]:
+    """在事件循环中执行图表生成流程，用于提供异步生成方法的图表类型（如Mermaid图）
     
+    Args:
+        plot_type: 图表类型
+        params: 原始请求参数
+        debug_mode: 是否启用调试模式
+        
+    Returns:
+        Dict[str, Any]: 包含图表保存路径和状态的响应
+    """
     try:
-        # 只在首次调用时设置字体
-        if not _fonts_initialized:
-            # 导入字体设置工具
-            from src.utils.font_utils import set_matplotlib_fonts
-            
-            # 设置中文字体
-            set_matplotlib_fonts()
-            _fonts_initialized = True
+        target_func, filtered_params, target_sig = _prepare_plotting_call(plot_type, params, use_async=True)
         
-        # 如果指定了主题，应用主题
-        if theme:
-            import matplotlib.pyplot as plt
-            # 检查主题是否存在
-            if theme in plt.style.available:
-                plt.style.use(theme)
-                logger.debug(f"应用图表主题: {theme}")
-            elif theme == 'default':
-                # 'default'是特殊主题，使用matplotlib默认设置
-                plt.style.use('default')
-                logger.debug("使用默认主题")
-            else:
-                logger.warning(f"主题 '{theme}' 不可用，使用默认主题")
+        # 执行绘图
+        logger.info("开始生成图表，图表类型: %s", plot_type)
+        result = await execute_plotting_async(target_func, filtered_params, target_sig)
         
+        logger.info("图表生成成功，保存路径: %s", result)
+        return {"status": "success", "message": "图表生成成功", "save_path": result}
     except Exception as e:
-        logger.error(f"设置图表主题时出错: {str(e)}")
-        # 不抛出异常，继续使用默认设置
\ No newline at end of file
+        return handle_plotting_exception(e, debug_mode)
@@ -3,9 +3,8 @@
 """参数验证工具"""
 
 import os
+from types import MappingProxyType
 from typing import Dict, Any, List, Optional, Union
-import jsonschema
-from jsonschema import validate
 
 from src.utils.error_handling import ValidationError
 import logging
@@ -13,6 +12,24 @@ import logging
 # 配置日志
 schema_logger = logging.getLogger('schema_validator')
 
+# 每种图表类型的必需参数（按错误提示中的顺序排列）
+REQUIRED_PARAMS_MAP = MappingProxyType({
+    'line_chart': ('data', 'x_field', 'y_fields'),
+    'bar_chart': ('data', 'x_field', 'y_fields'),
+    'pie_chart': ('data', 'name_field', 'value_field'),
+    'scatter_plot': ('data', 'x_field', 'y_field'),
+    'heatmap': ('data', 'x_field', 'y_field', 'value_field'),
+    'mermaid_chart': ('mermaid_code',)
+})
+
+# 必需参数集合，导入时构建一次，用于与参数键做集合差运算
+_REQUIRED_PARAM_SETS = {plot_type: frozenset(names) for plot_type, names in REQUIRED_PARAMS_MAP.items()}
+
+# 取值固定的枚举参数，在分派到绘图进程前即可拒绝非法值
+HEATMAP_AGGREGATIONS = ('mean', 'sum', 'max', 'min', 'count')
+MERMAID_THEMES = ('default', 'dark', 'forest', 'neutral')
+MERMAID_FORMATS = ('png', 'svg', 'mmd')
+
 def validate_parameters(plot_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
     """验证图表参数并返回处理后的参数
     
@@ -41,7 +58,7 @@ def validate_parameters(plot_type: str, params: Dict[str, Any]) -> Dict[str, Any
     # 特定图表类型的额外验证
     _chart_specific_validations(plot_type, params)
     
-    schema_logger.info(f"参数验证通过，图表类型: {plot_type}")
+    schema_logger.info("参数验证通过，图表类型: %s", plot_type)
     return params
 
 def _check_required_params(plot_type: str, params: Dict[str, Any]) -> None:
@@ -54,27 +71,16 @@ def _check_required_params(plot_type: str, params: Dict[str, Any]) -> None:
     Raises:
         ValidationError: 缺少必需参数时抛出
     """
-    # 定义每种图表类型的必需参数
-    required_params_map = {
-        'line_chart': ['data', 'x_field', 'y_fields'],
-        'bar_chart': ['data', 'x_field', 'y_fields'],
-        'pie_chart': ['data', 'name_field', 'value_field'],
-        'scatter_plot': ['data', 'x_field', 'y_field'],
-        'heatmap': ['data', 'x_field', 'y_field', 'value_field'],
-        'mermaid_chart': ['mermaid_code']
-    }
-    
     # 检查图表类型是否支持
-    if plot_type not in required_params_map:
-        schema_logger.error(f"不支持的图表类型: {plot_type}")
-        raise ValidationError(f"不支持的图表类型 '{plot_type}'，支持的类型有: {', '.join(required_params_map.keys())}")
+    required_set = _REQUIRED_PARAM_SETS.get(plot_type)
+    if required_set is None:
+        schema_logger.error("不支持的图表类型: %s", plot_type)
+        raise ValidationError(f"不支持的图表类型 '{plot_type}'，支持的类型有: {', '.join(REQUIRED_PARAMS_MAP.keys())}")
     
-    # 检查必需参数是否存在
-    required_params = required_params_map[plot_type]
-    missing_params = [param for param in required_params if param not in params]
-    
-    if missing_params:
-        schema_logger.error(f"缺少必需参数: {missing_params}")
+    # 检查必需参数是否存在（集合差运算，缺失时再按定义顺序生成提示）
+    if required_set - params.keys():
+        missing_params = [param for param in REQUIRED_PARAMS_MAP[plot_type] if param not in params]
+        schema_logger.error("缺少必需参数: %s", missing_params)
         params_str = "', '" .join(missing_params)
         raise ValidationError(f"缺少必需参数: '{params_str}'")
     
@@ -104,10 +110,60 @@ def _validate_data_fields(plot_type: str, params: Dict[str, Any]) -> None:
         schema_logger.error("数据列表不能为空")
         raise ValidationError("数据列表不能为空")
     
+    # 一次遍历检查所有数据项的类型和字段，全部通过时直接返回
+    fields = _data_field_names(plot_type, params)
+    if fields is not None:
+        required_fields = frozenset(fields)
+        for item in data:
+            if not isinstance(item, dict) or not item.keys() >= required_fields:
+                break
+        else:
+            return
+    
+    # 存在不合格的数据项，逐项检查以生成详细的错误信息
+    _raise_data_field_error(plot_type, params)
+
+def _data_field_names(plot_type: str, params: Dict[str, Any]) -> Optional[List[str]]:
+    """获取每个数据项中必须存在的字段名
+    
+    Args:
+        plot_type: 图表类型
+        params: 图表参数字典
+        
+    Returns:
+        字段名列表，y_fields类型不合法时返回None
+    """
+    fields = []
+    if plot_type in ('line_chart', 'bar_chart', 'scatter_plot', 'heatmap') and 'x_field' in params:
+        fields.append(params['x_field'])
+    if plot_type in ('line_chart', 'bar_chart') and 'y_fields' in params:
+        if not isinstance(params['y_fields'], list):
+            return None
+        fields.extend(params['y_fields'])
+    if plot_type == 'scatter_plot' and 'y_field' in params:
+        fields.append(params['y_field'])
+    if plot_type == 'pie_chart' and 'name_field' in params and 'value_field' in params:
+        fields.extend((params['name_field'], params['value_field']))
+    if plot_type == 'heatmap' and 'y_field' in params and 'value_field' in params:
+        fields.extend((params['y_field'], params['value_field']))
+    return fields
+
+def _raise_data_field_error(plot_type: str, params: Dict[str, Any]) -> None:
+    """逐项检查数据字段，抛出包含缺失索引的详细错误
+    
+    Args:
+        plot_type: 图表类型
+        params: 图表参数字典
+        
+    Raises:
+        ValidationError: 数据字段验证失败时抛出
+    """
+    data = params['data']
+    
     # 检查数据项是否为字典
     invalid_items = [i for i, item in enumerate(data) if not isinstance(item, dict)]
     if invalid_items:
-        schema_logger.error(f"数据项必须是字典类型，无效项索引: {invalid_items}")
+        schema_logger.error("数据项必须是字典类型，无效项索引: %s", invalid_items)
         raise ValidationError(f"数据项必须是字典类型，无效项索引: {invalid_items}")
     
     # 图表类型特定的字段验证
@@ -116,7 +172,7 @@ def _validate_data_fields(plot_type: str, params: Dict[str, Any]) -> None:
             x_field = params['x_field']
             missing_fields = [i for i, item in enumerate(data) if x_field not in item]
             if missing_fields:
-                schema_logger.error(f"数据项中缺少x_field '{x_field}'，缺失索引: {missing_fields}")
+                schema_logger.error("数据项中缺少x_field '%s'，缺失索引: %s", x_field, missing_fields)
                 raise ValidationError(f"数据项中缺少x_field '{x_field}'，缺失索引: {missing_fields}")
     
     if plot_type in ['line_chart', 'bar_chart']:
@@ -129,7 +185,7 @@ def _validate_data_fields(plot_type: str, params: Dict[str, Any]) -> None:
             for y_field in y_fields:
                 missing_fields = [i for i, item in enumerate(data) if y_field not in item]
                 if missing_fields:
-                    schema_logger.error(f"数据项中缺少y_field '{y_field}'，缺失索引: {missing_fields}")
+                    schema_logger.error("数据项中缺少y_field '%s'，缺失索引: %s", y_field, missing_fields)
                     raise ValidationError(f"数据项中缺少y_field '{y_field}'，缺失索引: {missing_fields}")
     
     if plot_type in ['scatter_plot']:
@@ -137,7 +193,7 @@ def _validate_data_fields(plot_type: str, params: Dict[str, Any]) -> None:
             y_field = params['y_field']
             missing_fields = [i for i, item in enumerate(data) if y_field not in item]
             if missing_fields:
-                schema_logger.error(f"数据项中缺少y_field '{y_field}'，缺失索引: {missing_fields}")
+                schema_logger.error("数据项中缺少y_field '%s'，缺失索引: %s", y_field, missing_fields)
                 raise ValidationError(f"数据项中缺少y_field '{y_field}'，缺失索引: {missing_fields}")
     
     if plot_type in ['pie_chart']:
@@ -147,12 +203,12 @@ def _validate_data_fields(plot_type: str, params: Dict[str, Any]) -> None:
             
             missing_name = [i for i, item in enumerate(data) if name_field not in item]
             if missing_name:
-                schema_logger.error(f"数据项中缺少name_field '{name_field}'，缺失索引: {missing_name}")
+                schema_logger.error("数据项中缺少name_field '%s'，缺失索引: %s", name_field, missing_name)
                 raise ValidationError(f"数据项中缺少name_field '{name_field}'，缺失索引: {missing_name}")
             
             missing_value = [i for i, item in enumerate(data) if value_field not in item]
             if missing_value:
-                schema_logger.error(f"数据项中缺少value_field '{value_field}'，缺失索引: {missing_value}")
+                schema_logger.error("数据项中缺少value_field '%s'，缺失索引: %s", value_field, missing_value)
                 raise ValidationError(f"数据项中缺少value_field '{value_field}'，缺失索引: {missing_value}")
     
     if plot_type in ['heatmap']:
@@ -162,12 +218,12 @@ def _validate_data_fields(plot_type: str, params: Dict[str, Any]) -> None:
             
             missing_y = [i for i, item in enumerate(data) if y_field not in item]
             if missing_y:
-                schema_logger.error(f"数据项中缺少y_field '{y_field}'，缺失索引: {missing_y}")
+                schema_logger.error("数据项中缺少y_field '%s'，缺失索引: %s", y_field, missing_y)
                 raise ValidationError(f"数据项中缺少y_field '{y_field}'，缺失索引: {missing_y}")
             
             missing_value = [i for i, item in enumerate(data) if value_field not in item]
             if missing_value:
-                schema_logger.error(f"数据项中缺少value_field '{value_field}'，缺失索引: {missing_value}")
+                schema_logger.error("数据项中缺少value_field '%s'，缺失索引: %s", value_field, missing_value)
                 raise ValidationError(f"数据项中缺少value_field '{value_field}'，缺失索引: {missing_value}")
 
 def _chart_specific_validations(plot_type: str, params: Dict[str, Any]) -> None:
@@ -183,28 +239,47 @@ def _chart_specific_validations(plot_type: str, params: Dict[str, Any]) -> None:
     # 饼图特定验证
     if plot_type == 'pie_chart' and 'data' in params and 'value_field' in params:
         value_field = params['value_field']
-        negative_values = [(i, item[value_field]) for i, item in enumerate(params['data']) 
-                          if isinstance(item, dict) and value_field in item and item[value_field] < 0]
+        # _validate_data_fields已保证每个数据项都是包含value_field的字典
+        negative_values = [(i, value) for i, item in enumerate(params['data'])
+                          if (value := item[value_field]) < 0]
         
         if negative_values:
-            schema_logger.error(f"饼图数值不能为负数，负值项: {negative_values}")
+            schema_logger.error("饼图数值不能为负数，负值项: %s", negative_values)
             error_msg = "饼图数值不能为负数，以下索引项包含负值: " + ", ".join([f"{idx}({val})" for idx, val in negative_values])
             raise ValidationError(error_msg)
     
+    # 热力图聚合函数验证
+    if plot_type == 'heatmap' and params.get('aggregation', 'mean') not in HEATMAP_AGGREGATIONS:
+        schema_logger.error("不支持的聚合函数 '%s'", params['aggregation'])
+        raise ValidationError(f"不支持的聚合函数 '{params['aggregation']}'，支持的有: {', '.join(HEATMAP_AGGREGATIONS)}")
+    
+    # Mermaid主题验证
+    if plot_type == 'mermaid_chart' and params.get('theme', 'default') not in MERMAID_THEMES:
+        schema_logger.error("不支持的Mermaid主题 '%s'", params['theme'])
+        raise ValidationError(f"不支持的Mermaid主题 '{params['theme']}'，支持的主题: {', '.join(MERMAID_THEMES)}")
+    
     # Mermaid图特定验证
     if plot_type == 'mermaid_chart' and 'save_path' in params and params['save_path']:
         ext = os.path.splitext(params['save_path'])[1].lower()[1:]
-        if ext not in ['png', 'svg', 'mmd']:
-            schema_logger.error(f"不支持的Mermaid图文件格式 '{ext}'")
-            raise ValidationError(f"不支持的Mermaid图文件格式 '{ext}'，支持的格式: png, svg, mmd")
+        if ext not in MERMAID_FORMATS:
+            schema_logger.error("不支持的Mermaid图文件格式 '%s'", ext)
+            raise ValidationError(f"不支持的Mermaid图文件格式 '{ext}'，支持的格式: {', '.join(MERMAID_FORMATS)}")
     
     # 图表尺寸验证
-    if 'figsize' in params and params['figsize']:
-        if not isinstance(params['figsize'], list) or len(params['figsize']) != 2:
+    figsize = params.get('figsize')
+    if figsize:
+        if not isinstance(figsize, list) or len(figsize) != 2:
             schema_logger.error("figsize必须是包含两个数字的列表")
             raise ValidationError("figsize必须是包含两个数字的列表，例如: [10, 6]")
         
-        if params['figsize'][0] <= 0 or params['figsize'][1] <= 0:
+        # 非数字元素（如字符串）比较时抛出TypeError，同样转换为ValidationError
+        width, height = figsize
+        try:
+            positive = width > 0 and height > 0
+        except TypeError:
+            schema_logger.error("figsize中的元素必须是数字: %s", figsize)
+            raise ValidationError("figsize中的元素必须是数字，例如: [10, 6]") from None
+        if not positive:
             schema_logger.error("figsize中的数值必须大于0")
             raise ValidationError("figsize中的数值必须大于0")
     
@@ -217,6 +292,8 @@ def _chart_specific_validations(plot_type: str, params: Dict[str, Any]) -> None:
 def process_nested_params(params: Dict[str, Any]) -> Dict[str, Any]:
     """处理嵌套参数，提取内部params并转换数据类型
     
+    无需转换时直接返回原字典而不复制，调用方不应修改返回值
+    
     Args:
         params: 原始参数字典
         
@@ -230,10 +307,22 @@ def process_nested_params(params: Dict[str, Any]) -> Dict[str, Any]:
         if not isinstance(processed_params, dict):
             processed_params = {}
     else:
-        processed_params = params.copy() if isinstance(params, dict) else {}
+        processed_params = params if isinstance(params, dict) else {}
+    
+    # y_fields支持逗号分隔的字符串，列表直接保留
+    y_fields = processed_params.get('y_fields')
+    if isinstance(y_fields, str):
+        processed_params = {**processed_params, 'y_fields': _split_fields(y_fields)}
     
     return processed_params
 
+def _split_fields(value: str) -> List[str]:
+    """将逗号分隔的字段字符串拆分为字段名列表，忽略空项"""
+    if ',' not in value:
+        field = value.strip()
+        return [field] if field else []
+    return [field for field in map(str.strip, value.split(',')) if field]
+
 # 保留原有的validate_chart_params函数以保持向后兼容性
 def validate_chart_params(chart_type: str, params: Dict[str, Any]) -> bool:
     """